@@ -0,0 +1,152 @@
+"""
+Бенчмарк движков отрисовки графиков: matplotlib и pillow.
+
+Каждый движок замеряется в отдельном чистом процессе (как воркер пула
+графиков): время загрузки движка, задержка отрисовки и кодирования p50/p95
+для булевых и числовых привычек за разные периоды и годового календаря,
+размер картинки и пиковый RSS процесса. Формат, ширина и бюджет размера
+берутся из --format/--width/--max-bytes (по умолчанию — из окружения).
+Данные синтетические и одинаковые для обоих движков. База и Redis не нужны.
+
+    python -m benchmarks.charts --iterations 30 --output charts.json
+    python -m benchmarks.charts --format webp --max-bytes 50000
+    python -m benchmarks.charts --save /tmp/charts  # картинки для сравнения на глаз
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+BACKENDS = ("matplotlib", "pillow")
+HABIT_TYPES = ("boolean", "numeric")
+
+
+# Одинаковые для всех движков данные графика
+def sample_chart(habit_type: str, days: int, view: str = "bars", seed: int = 42):
+    from datetime import date, timedelta
+
+    import numpy as np
+
+    from bot.services.charts import ChartData
+
+    rng = np.random.default_rng(seed + days)
+    values = (rng.random(days) < 0.7).astype(np.int64)
+    if habit_type == "numeric":
+        values *= rng.integers(1, 50, days)
+    return ChartData(
+        habit_name="Утренняя пробежка",
+        habit_type=habit_type,
+        numeric_unit="км" if habit_type == "numeric" else None,
+        start_date=date.today() - timedelta(days=days - 1),
+        values=values,
+        view=view,
+    )
+
+
+# Замер одного движка (в дочернем процессе); печатает JSON
+def measure_backend(backend: str, days_list, iterations: int, save_dir: str = None):
+    import numpy as np
+
+    from bot.services.chart_encoding import chart_filename
+    from bot.services.charts import HEATMAP_DAYS, _init_worker, chart_render_function
+
+    started = time.perf_counter()
+    _init_worker(backend)
+    load_ms = (time.perf_counter() - started) * 1000
+    render = chart_render_function(backend)
+
+    charts = {}
+    for habit_type in HABIT_TYPES:
+        cases = [(f"{habit_type}_{days}", sample_chart(habit_type, days)) for days in days_list]
+        cases.append((f"heatmap_{habit_type}", sample_chart(habit_type, HEATMAP_DAYS, view="heatmap")))
+        for name, data in cases:
+            render(data)  # первый вызов прогревает кэши шрифтов
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                image = render(data)
+                timings.append((time.perf_counter() - started) * 1000)
+            charts[name] = {
+                "p50_ms": round(float(np.percentile(timings, 50)), 2),
+                "p95_ms": round(float(np.percentile(timings, 95)), 2),
+                "kb": round(len(image) / 1024, 1),
+            }
+            if save_dir:
+                os.makedirs(save_dir, exist_ok=True)
+                with open(os.path.join(save_dir, chart_filename(f"{backend}_{name}")), "wb") as f:
+                    f.write(image)
+
+    return {
+        "load_ms": round(load_ms, 1),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "charts": charts,
+    }
+
+
+def run_child(backend: str, args) -> dict:
+    command = [sys.executable, "-m", "benchmarks.charts", "--child", backend,
+               "--iterations", str(args.iterations), "--days", *map(str, args.days)]
+    if args.save:
+        command += ["--save", args.save]
+    env = dict(os.environ)
+    env.setdefault("BOT_TOKEN", "0:charts-bench")
+    env.setdefault("DATABASE_URL", "postgresql+asyncpg://bench@localhost/bench")
+    for name, value in (("CHART_FORMAT", args.format), ("CHART_WIDTH", args.width), ("CHART_MAX_BYTES", args.max_bytes)):
+        if value is not None:
+            env[name] = str(value)
+    out = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def print_table(report: dict, file=sys.stderr):
+    backends = list(report["backends"])
+    print(f"{'график':<16}" + "".join(f"{b + ' p50':>18}{'p95':>9}{'КБ':>7}" for b in backends), file=file)
+    for name in report["backends"][backends[0]]["charts"]:
+        cells = ""
+        for backend in backends:
+            row = report["backends"][backend]["charts"][name]
+            cells += f"{row['p50_ms']:>18.1f}{row['p95_ms']:>9.1f}{row['kb']:>7.1f}"
+        print(f"{name:<16}{cells}", file=file)
+    for backend, result in report["backends"].items():
+        print(f"{backend}: загрузка {result['load_ms']} мс, пиковый RSS {result['peak_rss_kb'] / 1024:.1f} МБ", file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк движков отрисовки графиков")
+    parser.add_argument("--backends", nargs="*", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--days", nargs="*", type=int, default=[7, 14, 31], help="периоды графиков")
+    parser.add_argument("--iterations", type=int, default=20, help="отрисовок на график")
+    parser.add_argument("--format", choices=("png", "png8", "webp", "jpeg"), help="CHART_FORMAT")
+    parser.add_argument("--width", type=int, help="CHART_WIDTH")
+    parser.add_argument("--max-bytes", type=int, help="CHART_MAX_BYTES")
+    parser.add_argument("--save", metavar="DIR", help="сохранить картинки последней отрисовки")
+    parser.add_argument("--output", help="файл для JSON (по умолчанию stdout)")
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_backend(args.child, args.days, args.iterations, args.save)))
+        return
+
+    report = {
+        "python": platform.python_version(),
+        "iterations": args.iterations,
+        "format": args.format or os.getenv("CHART_FORMAT", "png8"),
+        "backends": {backend: run_child(backend, args) for backend in args.backends},
+    }
+    print_table(report)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from bot.services.streaks import rebuild_streaks
+
+# telegram_id первого тестового пользователя
+FIRST_USER_ID = 10_000_000
+
+# Каждая третья привычка — числовая
+NUMERIC_EVERY = 3
+
+
+# Заполняет пустую базу тестовыми пользователями, привычками и отметками
+async def seed_database(session, users: int, habits_per_user: int, years: float,
+                        density: float = 0.7, seed: float = 0.42):
+    """
+    Всё генерируется на стороне PostgreSQL (generate_series), поэтому
+    миллионы отметок вставляются за секунды. Отметки — до вчерашнего дня
+    включительно: сегодняшнюю ставят сценарии.
+
+    :param density: доля дней с отметкой
+    :param seed: зерно random() PostgreSQL, чтобы прогоны были сравнимы
+    """
+    today = datetime.utcnow().date()
+    first_day = today - timedelta(days=int(years * 365))
+
+    await session.execute(text(
+        "TRUNCATE habit_notes, habit_logs, habits, users, user_daily_stats RESTART IDENTITY CASCADE"
+    ))
+    await session.execute(text("SELECT setseed(:seed)"), {"seed": seed})
+
+    await session.execute(text("""
+        INSERT INTO users (telegram_id, username, full_name, registered_at, timezone,
+                           reminders_enabled, reminder_time)
+        SELECT :first + g, 'bench' || g, 'Bench User ' || g, :registered, 'UTC', false, '09:00'
+        FROM generate_series(0, :users - 1) g
+    """), {"first": FIRST_USER_ID, "users": users, "registered": first_day})
+
+    await session.execute(text("""
+        INSERT INTO habits (user_id, name, created_at, is_active, allow_notes, habit_type, numeric_unit)
+        SELECT u.telegram_id, 'Привычка ' || j, :created, true, false,
+               CASE WHEN j % :numeric_every = 0 THEN 'numeric' ELSE 'boolean' END,
+               CASE WHEN j % :numeric_every = 0 THEN 'раз' END
+        FROM users u, generate_series(1, :habits) j
+        ORDER BY u.telegram_id, j
+    """), {"created": first_day, "habits": habits_per_user, "numeric_every": NUMERIC_EVERY})
+
+    await session.execute(text("""
+        INSERT INTO habit_logs (habit_id, date, completed, value)
+        SELECT h.id, d::date, true,
+               CASE WHEN h.habit_type = 'numeric' THEN 1 + floor(random() * 50)::int END
+        FROM habits h, generate_series(CAST(:first_day AS date), CAST(:last_day AS date), interval '1 day') d
+        WHERE random() < :density
+    """), {"first_day": first_day, "last_day": today - timedelta(days=1), "density": density})
+
+    # Дневные сводки — так же, как их заполняет миграция 0007
+    await session.execute(text("""
+        INSERT INTO user_daily_stats (user_id, date, completions, numeric_total)
+        SELECT h.user_id, l.date, count(*), COALESCE(sum(l.value), 0)
+        FROM habit_logs l
+        JOIN habits h ON h.id = l.habit_id
+        GROUP BY h.user_id, l.date
+    """))
+
+    await rebuild_streaks(session)
+    await session.execute(text("ANALYZE"))
+    await session.commit()
+
+
+# Привычки тестовых пользователей: [(user_id, habit_id, habit_type)], по пользователям
+async def load_habits(session):
+    rows = await session.execute(text(
+        "SELECT user_id, id, habit_type FROM habits ORDER BY user_id, id"
+    ))
+    return rows.all()
@@ -0,0 +1,149 @@
+"""
+Бенчмарк запуска бота: время импорта bot.main и память процесса.
+
+Каждый замер — отдельный чистый процесс python, который импортирует модуль
+и сообщает время импорта, RSS и какие тяжёлые библиотеки оказались загружены.
+Затем в том же процессе выполняется прогрев (bot.services.warmup), чтобы было
+видно, сколько времени и памяти он откладывает. Отдельный прогон с
+-X importtime показывает пакеты, дольше всего загружающиеся при старте.
+
+Если задан бюджет (--max-import-ms, --max-rss-mb) и он превышен или при
+импорте загрузилась библиотека из --forbid, бенчмарк завершается с кодом 1.
+
+    python -m benchmarks.startup --runs 10 --output startup.json
+    python -m benchmarks.startup --max-import-ms 1500 --max-rss-mb 120
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+# Библиотеки, которые процесс бота должен загружать лениво
+HEAVY_MODULES = ("numpy", "matplotlib", "PIL", "celery", "requests")
+
+# Код замера в дочернем процессе; печатает одну строку JSON
+PROBE = """
+import json, os, sys, time
+
+def rss_kb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+started = time.perf_counter()
+import {module}
+import_ms = (time.perf_counter() - started) * 1000
+result = {{
+    "import_ms": import_ms,
+    "rss_kb": rss_kb(),
+    "modules": len(sys.modules),
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}
+
+from bot.services.warmup import LAZY_MODULES, _import_all
+started = time.perf_counter()
+_import_all(LAZY_MODULES)
+result["warmup_ms"] = (time.perf_counter() - started) * 1000
+result["warmup_rss_kb"] = rss_kb()
+print(json.dumps(result))
+"""
+
+
+# Окружение дочернего процесса: config.py требует токен и URL базы, соединений при импорте нет
+def probe_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("BOT_TOKEN", "0:startup-bench")
+    env.setdefault("DATABASE_URL", "postgresql+asyncpg://bench@localhost/bench")
+    return env
+
+
+def run_probe(module: str, heavy) -> dict:
+    code = PROBE.format(module=module, heavy=tuple(heavy))
+    out = subprocess.run([sys.executable, "-c", code], env=probe_env(), capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+# Пакеты верхнего уровня по собственному времени импорта (-X importtime), мс
+def import_profile(module: str, top: int) -> list:
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         env=probe_env(), capture_output=True, text=True, check=True)
+    packages = defaultdict(int)
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us)
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"package": name, "self_ms": round(us / 1000, 1)} for name, us in ranked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запуска бота: время импорта и память")
+    parser.add_argument("--module", default="bot.main", help="что импортировать")
+    parser.add_argument("--runs", type=int, default=5, help="число чистых процессов")
+    parser.add_argument("--top", type=int, default=10, help="сколько пакетов показать в профиле импорта")
+    parser.add_argument("--max-import-ms", type=float, help="бюджет медианы времени импорта")
+    parser.add_argument("--max-rss-mb", type=float, help="бюджет RSS после импорта")
+    parser.add_argument("--forbid", nargs="*", default=list(HEAVY_MODULES),
+                        help="библиотеки, которые не должны загружаться при импорте")
+    parser.add_argument("--output", help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    heavy = sorted(set(HEAVY_MODULES) | set(args.forbid))
+    # Первый запуск компилирует .pyc — в замер не входит
+    run_probe(args.module, heavy)
+    runs = [run_probe(args.module, heavy) for _ in range(args.runs)]
+
+    import_ms = [r["import_ms"] for r in runs]
+    rss_kb = statistics.median(r["rss_kb"] for r in runs)
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+    report = {
+        "module": args.module,
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "import_ms": {
+            "median": round(statistics.median(import_ms), 1),
+            "min": round(min(import_ms), 1),
+            "max": round(max(import_ms), 1),
+        },
+        "rss_kb": int(rss_kb),
+        "modules": runs[-1]["modules"],
+        "heavy_loaded": loaded,
+        "warmup_ms": round(statistics.median(r["warmup_ms"] for r in runs), 1),
+        "warmup_rss_growth_kb": int(statistics.median(r["warmup_rss_kb"] - r["rss_kb"] for r in runs)),
+        "import_profile": import_profile(args.module, args.top),
+    }
+
+    problems = []
+    if args.max_import_ms and report["import_ms"]["median"] > args.max_import_ms:
+        problems.append(f"импорт {report['import_ms']['median']} мс при бюджете {args.max_import_ms:g}")
+    if args.max_rss_mb and rss_kb / 1024 > args.max_rss_mb:
+        problems.append(f"RSS {rss_kb / 1024:.1f} МБ при бюджете {args.max_rss_mb:g}")
+    forbidden = [m for m in loaded if m in args.forbid]
+    if forbidden:
+        problems.append(f"при импорте загружены: {', '.join(forbidden)}")
+    report["problems"] = problems
+
+    print(f"импорт {args.module}: {report['import_ms']['median']} мс (медиана), RSS {rss_kb / 1024:.1f} МБ, "
+          f"прогрев +{report['warmup_ms']} мс / +{report['warmup_rss_growth_kb'] / 1024:.1f} МБ", file=sys.stderr)
+    for row in report["import_profile"]:
+        print(f"    {row['package']:<24}{row['self_ms']:>9.1f} мс", file=sys.stderr)
+    for problem in problems:
+        print(f"НАРУШЕНИЕ: {problem}", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
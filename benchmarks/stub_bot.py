@@ -0,0 +1,48 @@
+import itertools
+import time
+
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Message, User
+
+# Методы Bot API, которые возвращают сообщение
+MESSAGE_METHODS = {"SendMessage", "EditMessageText", "SendPhoto", "EditMessageMedia"}
+
+
+class StubBotSession(BaseSession):
+    """
+    Сессия Bot API без сети: запросы не уходят в Telegram,
+    а получают правдоподобный ответ (сообщение, file_id фото или True).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self._ids = itertools.count(1)
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls += 1
+        name = type(method).__name__
+
+        if name == "GetMe":
+            return User(id=bot.id, is_bot=True, first_name="benchmark")
+        if name not in MESSAGE_METHODS:
+            return True
+
+        message = {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": getattr(method, "chat_id", None) or 1, "type": "private"},
+        }
+        if name == "SendPhoto":
+            message["photo"] = [{
+                "file_id": f"stub-{next(self._ids)}", "file_unique_id": "stub", "width": 1200, "height": 800
+            }]
+        else:
+            message["text"] = getattr(method, "text", None) or ""
+        return Message.model_validate(message, context={"bot": bot})
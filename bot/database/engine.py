@@ -1,5 +1,20 @@
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
-from config import DATABASE_URL
+from config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_TIMEOUT,
+    DB_STATEMENT_CACHE_SIZE, DB_COMMAND_TIMEOUT,
+)
 
-engine = create_async_engine(DATABASE_URL)
-async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
\ No newline at end of file
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,  # переподключаемся раньше, чем соединение закроет сервер/балансировщик
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True,  # проверяем соединение перед выдачей из пула
+    connect_args={
+        # кэш подготовленных запросов asyncpg (0 — для PgBouncer в режиме transaction)
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "command_timeout": DB_COMMAND_TIMEOUT,
+    },
+)
+async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, String, Text, DateTime, Boolean
+from sqlalchemy import BigInteger, String, Text, DateTime, Boolean, Integer, SmallInteger, Index, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from datetime import datetime, date
 from sqlalchemy import ForeignKey, Date
@@ -25,6 +25,17 @@ class Habit(Base):
     allow_notes: Mapped[bool] = mapped_column(Boolean, default=False)
     habit_type: Mapped[str] = mapped_column(String(10), default="boolean")
     numeric_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+    # состояние серии (обновляется при отметке/отмене, см. bot/services/streaks.py):
+    current_streak: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    longest_streak: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    last_completed_date: Mapped[date] = mapped_column(Date, nullable=True)
+    # растёт при каждом изменении отметок/названия (входит в ключ кэша графиков):
+    data_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+    __table_args__ = (
+        # список привычек пользователя показывает только активные
+        Index("ix_habits_user_active", "user_id", postgresql_where=text("is_active")),
+    )
 
 
 class HabitLog(Base):
@@ -34,6 +45,13 @@ class HabitLog(Base):
     habit_id: Mapped[int] = mapped_column(ForeignKey("habits.id"))  # связь с привычкой
     date: Mapped[date] = mapped_column(Date, default=datetime.utcnow().date)
     completed: Mapped[bool] = mapped_column(Boolean, default=True)
+    # количество для числовых привычек (у булевых пусто):
+    value: Mapped[int] = mapped_column(Integer, nullable=True)
+
+    __table_args__ = (
+        # одна отметка на привычку в день; он же индекс для выборок по привычке и периоду
+        Index("uq_habit_logs_habit_date", "habit_id", "date", unique=True),
+    )
 
 
 class User(Base):
@@ -49,12 +67,28 @@ class User(Base):
     reminders_enabled: Mapped[bool] = mapped_column(Boolean, default=False)
     reminder_time: Mapped[str] = mapped_column(String(5), default="09:00")
     reminder_task_id: Mapped[str] = mapped_column(String(100), nullable=True)
+    # минута суток по UTC, когда отправлять напоминание (считается из reminder_time + timezone):
+    reminder_minute_utc: Mapped[int] = mapped_column(SmallInteger, nullable=True)
+
+    __table_args__ = (
+        # периодическая задача каждую минуту выбирает тех, кому пора напомнить
+        Index("ix_users_reminder_due", "reminder_minute_utc", postgresql_where=text("reminders_enabled")),
+    )
 
 
 class HabitNote(Base):
     __tablename__ = "habit_notes"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    log_id: Mapped[int] = mapped_column(ForeignKey("habit_logs.id"))
+    log_id: Mapped[int] = mapped_column(ForeignKey("habit_logs.id"), index=True)
     text: Mapped[str] = mapped_column(Text)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class UserDailyStats(Base):
+    """Сводка пользователя за день (обновляется при отметке/отмене, см. bot/services/habit_logs.py)"""
+    __tablename__ = "user_daily_stats"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    date: Mapped[date] = mapped_column(Date, primary_key=True)
+    completions: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    numeric_total: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
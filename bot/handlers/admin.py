@@ -0,0 +1,50 @@
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from bot.services.profiling import update_profiler
+from config import ADMIN_IDS
+
+router = Router(name="admin")
+# Команды роутера видят только администраторы, остальным они «не существуют»
+router.message.filter(F.from_user.id.in_(ADMIN_IDS))
+
+PROFILING_USAGE = (
+    "/profiling — состояние\n"
+    "/profiling on | off\n"
+    "/profiling rate 0.1 — доля апдейтов\n"
+    "/profiling slow 500 — сохранять апдейты дольше N мс (0 — все)"
+)
+
+
+# /profiling: профилирование апдейтов без перезапуска бота (во всех процессах)
+@router.message(Command('profiling'))
+async def cmd_profiling(message: Message, command: CommandObject):
+    args = (command.args or "").lower().split()
+    try:
+        if args == ["on"]:
+            settings = {"enabled": True}
+        elif args == ["off"]:
+            settings = {"enabled": False}
+        elif len(args) == 2 and args[0] == "rate" and 0 < float(args[1]) <= 1:
+            settings = {"sample_rate": float(args[1])}
+        elif len(args) == 2 and args[0] == "slow" and int(args[1]) >= 0:
+            settings = {"slow_ms": int(args[1])}
+        elif args and args != ["status"]:
+            raise ValueError(args)
+        else:
+            settings = {}
+    except ValueError:
+        await message.answer(PROFILING_USAGE)
+        return
+
+    if settings:
+        await update_profiler.configure(**settings)
+    text = update_profiler.status()
+    if settings:
+        text += "\n\nИзменения разосланы всем запущенным процессам бота."
+
+    recent = update_profiler.recent()
+    if recent:
+        text += "\n\nПоследние профили:\n" + "\n".join(recent)
+    await message.answer(text)
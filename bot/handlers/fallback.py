@@ -0,0 +1,17 @@
+from aiogram import Router
+from aiogram.types import CallbackQuery
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.handlers.habits import build_habits_message
+
+router = Router(name="fallback")
+
+
+# Кнопка, которую не разобрал ни один роутер: сообщение отправлено до смены формата callback_data
+# (habit_5, statsperiod_5_7, ...) — без ответа у пользователя крутилась бы загрузка
+@router.callback_query()
+async def outdated_button(callback: CallbackQuery, session: AsyncSession):
+    await callback.answer("Кнопка устарела")
+
+    text, keyboard = await build_habits_message(session, callback.from_user.id)
+    await callback.message.answer(text, reply_markup=keyboard)
@@ -7,20 +7,32 @@ from aiogram.exceptions import TelegramBadRequest
 
 
 from bot.database.models import Habit
-from bot.database.engine import async_session_maker
+from sqlalchemy.ext.asyncio import AsyncSession
 from bot.keyboards.reply import main_kb
 from bot.keyboards.inline import habits_list_kb, habit_menu_kb, habit_type_selection_kb, habit_notes_selection_kb, delete_confirmation_kb
-from bot.keyboards.inline import habit_notes_back_kb, stats_periods_kb, stats_navigation_kb
+from bot.keyboards.inline import habit_notes_back_kb, stats_periods_kb, stats_navigation_kb, general_stats_kb
+from bot.keyboards.inline import GENERAL_STATS_PERIODS, HabitAction, HabitCallback
 from bot.database.models import HabitLog, HabitNote
-
+from bot.services.chart_cache import chart_cache, chart_cache_key, mark_habit_changed
+from bot.services.file_ids import photo_file_ids
+from bot.services.identity_cache import identity_cache
+from bot.services.habit_logs import delete_habit_log, insert_habit_log, load_daily_stats, remove_habit_from_daily_stats
+from bot.services.charts import HEATMAP_DAYS, ChartData, ChartQueueFull, ChartWorkerCrashed, chart_renderer, prepare_chart_values
+from bot.services.metrics import CHART_BYTES, CHART_DURATION, CHART_QUEUE_FULL
+from bot.services.chart_encoding import chart_filename
+from bot.services.streaks import displayed_streak, habits_overview_query, record_completion, revoke_completion
+
+from config import CHART_FORMAT
 from sqlalchemy import select, delete, func
 from datetime import datetime, timedelta
 
-import matplotlib.pyplot as plt
-import io
-import re
+router = Router(name="habits")
+
+# Периоды статистики (дней), доступные на кнопках
+STATS_PERIODS = (7, 14, 31, 90, HEATMAP_DAYS)
+MAX_NUMERIC_VALUE = 2**31 - 1
 
-router = Router()
+WEEKDAY_NAMES = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
 
 
 class HabitForm(StatesGroup):
@@ -39,44 +51,28 @@ class NumericLogForm(StatesGroup):
     waiting_for_numeric_value = State()
 
 
+# Обработчики кнопок привычек по коду действия (см. HabitCallback)
+HABIT_ACTIONS = {}
 
 
-# Функция расчёта стрика
-async def calculate_streak(session, habit_id: int) -> int:
-    logs = await session.execute(
-        select(HabitLog.date)
-        .where(HabitLog.habit_id == habit_id, HabitLog.completed == True)
-        .order_by(HabitLog.date.desc())
-    )
-    dates = [log[0] for log in logs.fetchall()]
-
-    if not dates:
-        return 0
-
-    today = datetime.utcnow().date()
-    streak = 0
+# Регистрирует обработчик кнопки в таблице HABIT_ACTIONS
+def habit_action(*actions: HabitAction):
+    def register(handler):
+        for action in actions:
+            HABIT_ACTIONS[action] = handler
+        return handler
+    return register
 
-    # Проверяем последовательность дней от сегодня назад
-    expected_date = today
-    for log_date in dates:
-        if log_date == expected_date:
-            streak += 1
-            expected_date -= timedelta(days=1)
-        else:
-            break
 
-    return streak
 
 
 # Меню всех привычек
 async def build_habits_message(session, user_id: int):
-    habits = await session.execute(
-        select(Habit).where(
-            Habit.user_id == user_id,
-            Habit.is_active == True
-        )
-    )
-    habits = habits.scalars().all()
+    today = datetime.utcnow().date()
+
+    # Один запрос: привычки + серия + отметка за сегодня
+    habits = await session.execute(habits_overview_query(user_id, today))
+    habits = habits.all()
 
     if not habits:
         return "📭 У тебя пока нет активных привычек.", None
@@ -85,8 +81,9 @@ async def build_habits_message(session, user_id: int):
 
     habits_data = []
     for habit in habits:
-        streak = await calculate_streak(session, habit.id)
-        streak_text = f" 🔥{streak}" if streak > 0 else ""
+        streak = habit.streak
+        streak_text = " ✅" if habit.logged_today else ""
+        streak_text += f" 🔥{streak}" if streak > 0 else ""
         habits_data.append((habit, streak_text))
 
     keyboard = habits_list_kb(habits_data)
@@ -96,22 +93,17 @@ async def build_habits_message(session, user_id: int):
 
 # Меню управления конкретной привычки
 async def build_habit_menu(session, habit: Habit):
-    streak = await calculate_streak(session, habit.id)
     today = datetime.utcnow().date()
+    streak = displayed_streak(habit, today)
 
-    # Проверяем, отмечена ли сегодня
-    today_log = await session.execute(
-        select(HabitLog).where(
-            HabitLog.habit_id == habit.id,
-            HabitLog.date == today
-        )
-    )
-    is_today_logged = bool(today_log.scalar())
+    # Отмечена ли сегодня — видно по сохранённому состоянию серии
+    is_today_logged = habit.last_completed_date == today
 
     text = f"<b>🏷️ {habit.name}</b>\n"
     if habit.description:
         text += f"📝 {habit.description}\n"
     text += f"\n📊 Серия: {streak} день(ей) подряд\n"
+    text += f"🏆 Лучшая серия: {habit.longest_streak or 0}\n"
     text += f"📅 Создана: {habit.created_at.strftime('%d.%m.%Y')}\n\n"
 
     # Клавиатура
@@ -120,103 +112,42 @@ async def build_habit_menu(session, habit: Habit):
     return text, keyboard
 
 
-# Генерирует график выполнения привычки за указанное количество дней
-async def generate_habit_chart(habit: Habit, days: int) -> io.BytesIO:
-    async with async_session_maker() as session:
-        end_date = datetime.utcnow().date()
-        start_date = end_date - timedelta(days=days-1)
+# Генерирует график выполнения привычки за указанное количество дней (за год — календарь)
+async def generate_habit_chart(session, habit: Habit, days: int) -> bytes:
+    end_date = datetime.utcnow().date()
+    start_date = end_date - timedelta(days=days-1)
 
-        logs = await session.execute(
-            select(HabitLog.date, HabitNote.text)
-            .outerjoin(HabitNote, HabitLog.id == HabitNote.log_id)
-            .where(
-                HabitLog.habit_id == habit.id,
-                HabitLog.date >= start_date,
-                HabitLog.date <= end_date
-            )
-            .order_by(HabitLog.date)
+    logs = await session.execute(
+        select(HabitLog.date, HabitLog.value)
+        .where(
+            HabitLog.habit_id == habit.id,
+            HabitLog.date >= start_date,
+            HabitLog.date <= end_date
         )
-        log_data = logs.fetchall()
-
-        # Подготовка данных
-        dates = [start_date + timedelta(days=i) for i in range(days)]
-        values = []
-        labels = []
-
-        for date in dates:
-            record = next((log for log in log_data if log[0] == date), None)
-            if record:
-                if habit.habit_type == "numeric":
-                    note_text = record[1] or ""
-                    num = re.search(r'\d+', note_text)
-                    value = int(num.group()) if num else 1
-                else:
-                    value = 1
-                label = record[1] or "Выполнено"
-            else:
-                value = 0
-                label = "Нет"
-            values.append(value)
-            labels.append(label)
-
-        # ПОСТРОЕНИЕ ГРАФИКА
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8),
-                                        height_ratios=[1, 3] if habit.habit_type == "numeric" else [1, 2])
-        fig.suptitle(f'Статистика: {habit.name}', fontsize=16)
-
-        # ВЕРХНИЙ ГРАФИК
-        if habit.habit_type == "numeric":
-            cumulative = [sum(values[:i+1]) for i in range(days)]
-            ax1.plot(range(days), cumulative, color='#339af0', linewidth=2, marker='o')
-            ax1.fill_between(range(days), cumulative, alpha=0.2, color='#339af0')
-            ax1.set_ylabel('Накоплено', fontsize=10)
-            ax1.grid(True, alpha=0.3)
-            ax1.set_title(f'Прогресс за {days} дней', fontsize=12)
-        else:
-            completed = sum(1 for v in values if v > 0)
-            percentage = (completed / days) * 100 if days > 0 else 0
-            ax1.bar(['Выполнено'], [percentage], color='#51cf66')
-            ax1.bar(['Пропущено'], [100 - percentage], bottom=[percentage], color='#ff6b6b')
-            ax1.set_ylim(0, 100)
-            ax1.set_ylabel('Процент (%)', fontsize=10)
-            ax1.set_title(f'Выполнено: {completed}/{days} дней ({percentage:.1f}%)', fontsize=12)
-
-        # НИЖНИЙ ГРАФИК (разный для типов привычек)
-        if habit.habit_type == "numeric":
-            # ЧИСЛОВАЯ
-            colors = ['#51cf66' if v > 0 else '#ff6b6b' for v in values]
-            bars = ax2.bar(range(days), values, color=colors, edgecolor='white', linewidth=1)
-            for bar, val in zip(bars, values):
-                if val > 0:
-                    ax2.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
-                            str(val), ha='center', va='bottom', fontsize=9)
-            ax2.set_xlabel('Дни', fontsize=10)
-            ax2.set_ylabel(f'Количество ({habit.numeric_unit or "ед."})', fontsize=10)
-            from matplotlib.patches import Patch
-            legend_elements = [Patch(facecolor='#51cf66', label='Выполнено'),
-                             Patch(facecolor='#ff6b6b', label='Пропущено')]
-            ax2.legend(handles=legend_elements, loc='upper left')
-        else:
-            # БУЛЕВАЯ
-            colors = ['#51cf66' if v > 0 else '#ff6b6b' for v in values]
-            ax2.bar(range(days), [1] * days, color=colors, edgecolor='white', linewidth=1)
-            ax2.set_ylim(0, 1.2)
-            ax2.set_xlabel('Дни', fontsize=10)
-            ax2.set_ylabel('Факт', fontsize=10)
-            ax2.set_yticks([0, 1])
-            ax2.set_yticklabels(['Нет', 'Да'])
-
-        # Общие настройки для нижнего графика
-        ax2.set_xticks(range(days))
-        ax2.set_xticklabels([d.strftime('%d.%m') for d in dates], rotation=45, fontsize=9)
-        ax2.grid(True, alpha=0.3, axis='y')
-
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        plt.close()
-        buf.seek(0)
-        return buf
+        .order_by(HabitLog.date)
+    )
+
+    # Подготовка данных: одно значение на каждый день периода
+    values = prepare_chart_values(logs.fetchall(), start_date, days, habit.habit_type)
+
+    # Пока график рисуется, соединение с БД не держим — возвращаем его в пул
+    await session.commit()
+
+    # Сама отрисовка — в пуле процессов, event loop не блокируется
+    chart_data = ChartData(
+        habit_name=habit.name,
+        habit_type=habit.habit_type,
+        numeric_unit=habit.numeric_unit,
+        start_date=start_date,
+        values=values,
+        view="heatmap" if days == HEATMAP_DAYS else "bars",
+    )
+    return await chart_renderer.render(chart_data)
+
+
+# Проверяет, что привычка принадлежит пользователю (владелец берётся из кэша, без запроса)
+async def is_habit_owner(session, habit_id: int, user_id: int) -> bool:
+    return await identity_cache.habit_owner(session, habit_id) == user_id
 
 
 # Безопасно обновляет сообщение: редактирует или переотправляет при ошибке.
@@ -245,9 +176,8 @@ async def cmd_new(message: Message, state: FSMContext):
 
 # /list
 @router.message(Command('list'))
-async def cmd_list(message: Message):
-    async with async_session_maker() as session:
-        text, keyboard = await build_habits_message(session, message.from_user.id)
+async def cmd_list(message: Message, session: AsyncSession):
+    text, keyboard = await build_habits_message(session, message.from_user.id)
 
     if text is None:
         await message.answer("📭 У тебя пока нет активных привычек.")
@@ -259,8 +189,8 @@ async def cmd_list(message: Message):
 
 # 2. Reply кнопки
 @router.message(lambda message: message.text == '📋 Мои привычки')
-async def btn_list_habits(message: Message):
-    await cmd_list(message)
+async def btn_list_habits(message: Message, session: AsyncSession):
+    await cmd_list(message, session)
 
 @router.message(lambda message: message.text == '📝 Новая привычка')
 async def btn_new_habit(message: Message, state: FSMContext):
@@ -282,89 +212,130 @@ async def btn_help(message: Message):
     )
     await message.answer(help_text, parse_mode="HTML", reply_markup=main_kb())
 
+# Общая статистика пользователя за период (из дневных сводок)
+async def build_general_stats(session, user_id: int, days: int):
+    habit_counts = await session.execute(
+        select(
+            func.count(Habit.id),
+            func.count(Habit.id).filter(Habit.habit_type == "numeric"),
+        ).where(Habit.user_id == user_id, Habit.is_active == True)
+    )
+    total_habits, total_numeric = habit_counts.one()
+
+    if not total_habits:
+        return "📭 У вас пока нет активных привычек.", None
+
+    total_boolean = total_habits - total_numeric
+
+    # Одна строка сводки на день — стоимость зависит от длины периода, а не от числа отметок
+    end_date = datetime.utcnow().date()
+    start_date = end_date - timedelta(days=days - 1)
+    daily = await load_daily_stats(session, user_id, start_date, end_date)
+
+    completed = sum(row.completions for row in daily)
+    numeric_total = sum(row.numeric_total for row in daily)
+    active_days = sum(1 for row in daily if row.completions > 0)
+
+    by_weekday = [0] * 7
+    for row in daily:
+        by_weekday[row.date.weekday()] += row.completions
+
+    text = (
+        "<b>📊 Общая статистика</b>\n\n"
+        f"• Всего привычек: <b>{total_habits}</b>\n"
+        f"• Из них числовых: <b>{total_numeric}</b>\n"
+        f"• Факт выполнения: <b>{total_boolean}</b>\n\n"
+        f"• Выполнено за {days} дней: <b>{completed}</b> раз\n"
+        f"• В среднем в день: <b>{completed / days:.1f}</b>\n"
+        f"• Дней с отметками: <b>{active_days}</b> из {days}\n"
+    )
+    if total_numeric:
+        text += f"• Сумма по числовым привычкам: <b>{numeric_total}</b>\n"
+
+    text += "\n<b>По дням недели:</b>\n"
+    best = max(by_weekday) or 1
+    for name, count in zip(WEEKDAY_NAMES, by_weekday):
+        bar = "▇" * round(count / best * 8)
+        text += f"<code>{name}</code> {bar} {count}\n"
+
+    return text, general_stats_kb(days)
+
+
 @router.message(lambda message: message.text == '📊 Общая статистика')
-async def btn_general_stats(message: Message):
-    user_id = message.from_user.id
+async def btn_general_stats(message: Message, session: AsyncSession):
+    text, keyboard = await build_general_stats(session, message.from_user.id, GENERAL_STATS_PERIODS[0])
+
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
 
-    async with async_session_maker() as session:
-        # Получаем все привычки пользователя
-        habits = await session.execute(
-            select(Habit).where(Habit.user_id == user_id, Habit.is_active == True)
-        )
-        habits = habits.scalars().all()
-
-        if not habits:
-            await message.answer("📭 У вас пока нет активных привычек.")
-            return
-
-        # Считаем общую статистику
-        total_habits = len(habits)
-        total_numeric = sum(1 for h in habits if h.habit_type == "numeric")
-        total_boolean = total_habits - total_numeric
-
-        # Считаем общее количество выполненных дней за последнюю неделю
-        week_ago = datetime.utcnow().date() - timedelta(days=7)
-        completed_logs = await session.execute(
-            select(func.count(HabitLog.id))
-            .join(Habit, Habit.id == HabitLog.habit_id)
-            .where(Habit.user_id == user_id, HabitLog.date >= week_ago)
-        )
-        completed_last_week = completed_logs.scalar() or 0
-
-        text = (
-            "<b>📊 Общая статистика</b>\n\n"
-            f"• Всего привычек: <b>{total_habits}</b>\n"
-            f"• Из них числовых: <b>{total_numeric}</b>\n"
-            f"• Факт выполнения: <b>{total_boolean}</b>\n\n"
-            f"• Выполнено за 7 дней: <b>{completed_last_week}</b> раз\n"
-            f"• В среднем в день: <b>{completed_last_week / 7:.1f}</b>"
-        )
 
-    await message.answer(text, parse_mode="HTML")
+# Смена периода общей статистики
+@habit_action(HabitAction.GENERAL_STATS)
+async def change_general_stats_period(callback: CallbackQuery, callback_data: HabitCallback,
+                                      state: FSMContext, session: AsyncSession):
+    days = callback_data.days
+    if days not in GENERAL_STATS_PERIODS:
+        await callback.answer()
+        return
+
+    text, keyboard = await build_general_stats(session, callback.from_user.id, days)
+
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    except TelegramBadRequest:
+        pass  # период не изменился — сообщение то же самое
+    await callback.answer()
 
 
 
 # 3. Callback обработчики:
+# Все кнопки привычек приходят в один обработчик: данные разбираются один раз,
+# обработчик выбирается по коду действия из таблицы
+@router.callback_query(HabitCallback.filter())
+async def dispatch_habit_callback(callback: CallbackQuery, callback_data: HabitCallback,
+                                  state: FSMContext, session: AsyncSession):
+    handler = HABIT_ACTIONS[callback_data.action]
+    await handler(callback, callback_data, state, session)
+
 ## habit_ меню
 # Обработчик перехода к привычке
-@router.callback_query(lambda c: c.data.startswith("habit_"))
-async def show_habit_menu(callback: CallbackQuery):
-    habit_id = int(callback.data.split("_")[1])
+@habit_action(HabitAction.MENU)
+async def show_habit_menu(callback: CallbackQuery, callback_data: HabitCallback,
+                          state: FSMContext, session: AsyncSession):
+    habit = await session.get(Habit, callback_data.habit_id)
+    if not habit:
+        await callback.answer("Привычка не найдена")
+        return
 
-    async with async_session_maker() as session:
-        habit = await session.get(Habit, habit_id)
-        if not habit:
-            await callback.answer("Привычка не найдена")
-            return
+    if habit.user_id != callback.from_user.id:
+        await callback.answer("Это не твоя привычка")
+        return
 
-        if habit.user_id != callback.from_user.id:
-            await callback.answer("Это не твоя привычка")
-            return
-
-        text, keyboard = await build_habit_menu(session, habit)
+    text, keyboard = await build_habit_menu(session, habit)
 
     await safe_edit_message(callback, text, keyboard, parse_mode="HTML")
     await callback.answer()
 
 # Обработчик back_to_list
-@router.callback_query(lambda c: c.data == "back_to_list")
-async def back_to_list(callback: CallbackQuery):
-    async with async_session_maker() as session:
-        text, keyboard = await build_habits_message(session, callback.from_user.id)
+@habit_action(HabitAction.LIST)
+async def back_to_list(callback: CallbackQuery, callback_data: HabitCallback,
+                       state: FSMContext, session: AsyncSession):
+    text, keyboard = await build_habits_message(session, callback.from_user.id)
 
     await safe_edit_message(callback, text, keyboard, parse_mode="HTML")
     await callback.answer()
 
 # Обработка новой привычки
-@router.callback_query(lambda c: c.data == "new_habit")
-async def new_habit_from_button(callback: CallbackQuery, state: FSMContext):
+@habit_action(HabitAction.NEW)
+async def new_habit_from_button(callback: CallbackQuery, callback_data: HabitCallback,
+                                state: FSMContext, session: AsyncSession):
     await callback.message.answer("📝 Введи название новой привычки:")
     await state.set_state(HabitForm.waiting_for_name)
     await callback.answer()
 
 # Обработчик отмены создания привычки
-@router.callback_query(lambda c: c.data == "cancel_new_habit")
-async def cancel_new_habit(callback: CallbackQuery, state: FSMContext):
+@habit_action(HabitAction.CANCEL_NEW)
+async def cancel_new_habit(callback: CallbackQuery, callback_data: HabitCallback,
+                           state: FSMContext, session: AsyncSession):
     await state.clear()
     await callback.message.edit_text("❌ Создание привычки отменено.")
     await callback.answer()
@@ -372,93 +343,80 @@ async def cancel_new_habit(callback: CallbackQuery, state: FSMContext):
 
 ## log_ отметки
 # Обработчик отметки привычки.
-@router.callback_query(lambda c: c.data.startswith("log_"))
-async def process_habit_log(callback: CallbackQuery, state: FSMContext):
-    habit_id = int(callback.data.split("_")[1])
+@habit_action(HabitAction.LOG)
+async def process_habit_log(callback: CallbackQuery, callback_data: HabitCallback,
+                            state: FSMContext, session: AsyncSession):
+    habit_id = callback_data.habit_id
     today = datetime.utcnow().date()
 
-    async with async_session_maker() as session:
-        # Получаем привычку
-        habit = await session.get(Habit, habit_id)
-        if not habit:
-            await callback.answer("Привычка не найдена")
-            return
-
-        # Проверяем, не отмечена ли уже сегодня
-        existing = await session.execute(
-            select(HabitLog).where(
-                HabitLog.habit_id == habit_id,
-                HabitLog.date == today
-            )
+    # Получаем привычку
+    habit = await session.get(Habit, habit_id)
+    if not habit or habit.user_id != callback.from_user.id:
+        await callback.answer("Привычка не найдена")
+        return
+
+    # Проверяем, не отмечена ли уже сегодня (дата последней отметки хранится в привычке)
+    if habit.last_completed_date == today:
+        await callback.answer("✅ Уже отмечено сегодня!")
+        return
+
+    # 1. Если разрешены подписи (только для булевых привычек)
+    if habit.allow_notes and habit.habit_type == "boolean":
+        await state.update_data(
+            habit_id=habit_id,
+            today=today.isoformat()
         )
-        if existing.scalar():
-            await callback.answer("✅ Уже отмечено сегодня!")
-            return
-
-        # 1. Если разрешены подписи (только для булевых привычек)
-        if habit.allow_notes and habit.habit_type == "boolean":
-            await state.update_data(
-                habit_id=habit_id,
-                today=today.isoformat()
-            )
-            await callback.message.answer("📝 Добавь подпись к отметке (или отправь '-' для пропуска):")
-            await state.set_state(HabitLogForm.waiting_for_note)
-            await callback.answer()
-            return
-
-        # 2. Если числовая привычка (с подписями или без)
-        if habit.habit_type == "numeric":
-            await state.update_data(
-                habit_id=habit_id,
-                today=today.isoformat()
-            )
-            unit = habit.numeric_unit or "раз"
-            await callback.message.answer(f"Введите количество ({unit}):")
-            await state.set_state(NumericLogForm.waiting_for_numeric_value)
-            await callback.answer()
-            return
-
-        # 3. Булевая привычка без подписей (просто отмечаем)
-        log = HabitLog(habit_id=habit_id, date=today)
-        session.add(log)
-        await session.commit()
+        await callback.message.answer("📝 Добавь подпись к отметке (или отправь '-' для пропуска):")
+        await state.set_state(HabitLogForm.waiting_for_note)
+        await callback.answer()
+        return
 
-        # Возвращаемся в меню привычки
-        text, keyboard = await build_habit_menu(session, habit)
+    # 2. Если числовая привычка (с подписями или без)
+    if habit.habit_type == "numeric":
+        await state.update_data(
+            habit_id=habit_id,
+            today=today.isoformat()
+        )
+        unit = habit.numeric_unit or "раз"
+        await callback.message.answer(f"Введите количество ({unit}):")
+        await state.set_state(NumericLogForm.waiting_for_numeric_value)
+        await callback.answer()
+        return
+
+    # 3. Булевая привычка без подписей (просто отмечаем)
+    if await insert_habit_log(session, habit, today) is None:
+        await callback.answer("✅ Уже отмечено сегодня!")
+        return
+
+    await record_completion(session, habit, today)
+    await mark_habit_changed(session, habit)
+    await session.commit()
+
+    # Возвращаемся в меню привычки
+    text, keyboard = await build_habit_menu(session, habit)
 
     await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
     await callback.answer("✅ Отмечено!")
 
-@router.callback_query(lambda c: c.data.startswith("unlog_"))
-async def process_habit_unlog(callback: CallbackQuery):
-    habit_id = int(callback.data.split("_")[1])
+@habit_action(HabitAction.UNLOG)
+async def process_habit_unlog(callback: CallbackQuery, callback_data: HabitCallback,
+                              state: FSMContext, session: AsyncSession):
     today = datetime.utcnow().date()
 
-    async with async_session_maker() as session:
-        log_result = await session.execute(
-            select(HabitLog.id).where(
-                HabitLog.habit_id == habit_id,
-                HabitLog.date == today
-            )
-        )
-        log_id = log_result.scalar()
-
-        if not log_id:
-            await callback.answer("Запись не найдена.")
-            return
-
-        await session.execute(
-            delete(HabitNote).where(HabitNote.log_id == log_id)
-        )
+    habit = await session.get(Habit, callback_data.habit_id)
+    if not habit or habit.user_id != callback.from_user.id:
+        await callback.answer("Привычка не найдена")
+        return
 
-        await session.execute(
-            delete(HabitLog).where(HabitLog.id == log_id)
-        )
+    if not await delete_habit_log(session, habit, today):
+        await callback.answer("Запись не найдена.")
+        return
 
-        await session.commit()
+    await revoke_completion(session, habit, today)
+    await mark_habit_changed(session, habit)
+    await session.commit()
 
-        habit = await session.get(Habit, habit_id)
-        text, keyboard = await build_habit_menu(session, habit)
+    text, keyboard = await build_habit_menu(session, habit)
 
     await safe_edit_message(callback, text, keyboard)
     await callback.answer("✅ Отмена отметки!")
@@ -467,9 +425,14 @@ async def process_habit_unlog(callback: CallbackQuery):
 
 ## delete_
 # Удаление привычки
-@router.callback_query(lambda c: c.data.startswith("delete_"))
-async def delete_habit_handler(callback: CallbackQuery):
-    habit_id = int(callback.data.split("_")[1])
+@habit_action(HabitAction.DELETE)
+async def delete_habit_handler(callback: CallbackQuery, callback_data: HabitCallback,
+                               state: FSMContext, session: AsyncSession):
+    habit_id = callback_data.habit_id
+
+    if not await is_habit_owner(session, habit_id, callback.from_user.id):
+        await callback.answer("Привычка не найдена")
+        return
 
     # Клавиатура подтверждения
     confirm_keyboard = delete_confirmation_kb(habit_id)
@@ -482,29 +445,38 @@ async def delete_habit_handler(callback: CallbackQuery):
     await callback.answer()
 
 # Подтверждение удаления
-@router.callback_query(lambda c: c.data.startswith("confirm_delete_"))
-async def confirm_delete_habit(callback: CallbackQuery):
-    habit_id = int(callback.data.split("_")[2])
+@habit_action(HabitAction.CONFIRM_DELETE)
+async def confirm_delete_habit(callback: CallbackQuery, callback_data: HabitCallback,
+                               state: FSMContext, session: AsyncSession):
+    habit_id = callback_data.habit_id
     user_id = callback.from_user.id
 
-    async with async_session_maker() as session:
-        logs = await session.execute(
-            select(HabitLog.id).where(HabitLog.habit_id == habit_id)
-        )
-        log_ids = [log[0] for log in logs.fetchall()]
+    if not await is_habit_owner(session, habit_id, user_id):
+        await callback.answer("Привычка не найдена")
+        return
 
-        if log_ids:
-            await session.execute(
-                delete(HabitNote).where(HabitNote.log_id.in_(log_ids))
-            )
+    # Отметки удаляемой привычки больше не входят в общую статистику
+    await remove_habit_from_daily_stats(session, habit_id)
 
-        await session.execute(delete(HabitLog).where(HabitLog.habit_id == habit_id))
+    logs = await session.execute(
+        select(HabitLog.id).where(HabitLog.habit_id == habit_id)
+    )
+    log_ids = [log[0] for log in logs.fetchall()]
 
-        await session.execute(delete(Habit).where(Habit.id == habit_id))
+    if log_ids:
+        await session.execute(
+            delete(HabitNote).where(HabitNote.log_id.in_(log_ids))
+        )
 
-        await session.commit()
+    await session.execute(delete(HabitLog).where(HabitLog.habit_id == habit_id))
+
+    await session.execute(delete(Habit).where(Habit.id == habit_id))
 
-        text, keyboard = await build_habits_message(session, user_id)
+    await session.commit()
+    chart_cache.invalidate_habit(habit_id)
+    await identity_cache.habit_deleted(habit_id)
+
+    text, keyboard = await build_habits_message(session, user_id)
 
     await callback.message.edit_text(
         text or "✅ Привычка удалена!",
@@ -514,25 +486,28 @@ async def confirm_delete_habit(callback: CallbackQuery):
     await callback.answer("🗑️ Привычка удалена")
 
 # Отмена удаления
-@router.callback_query(lambda c: c.data.startswith("cancel_delete_"))
-async def cancel_delete_habit(callback: CallbackQuery):
-    habit_id = int(callback.data.split("_")[2])
-
-    async with async_session_maker() as session:
-        habit = await session.get(Habit, habit_id)
-        if habit:
-            # Возвращаемся в меню привычки
-            text, keyboard = await build_habit_menu(session, habit)
-            await safe_edit_message(callback, text, keyboard, parse_mode="HTML")
+@habit_action(HabitAction.CANCEL_DELETE)
+async def cancel_delete_habit(callback: CallbackQuery, callback_data: HabitCallback,
+                              state: FSMContext, session: AsyncSession):
+    habit = await session.get(Habit, callback_data.habit_id)
+    if habit and habit.user_id == callback.from_user.id:
+        # Возвращаемся в меню привычки
+        text, keyboard = await build_habit_menu(session, habit)
+        await safe_edit_message(callback, text, keyboard, parse_mode="HTML")
 
     await callback.answer("❌ Удаление отменено")
 
 
 ## stats_ статистика
 # Обработчик статистики
-@router.callback_query(lambda c: c.data.startswith("stats_"))
-async def show_stats_periods(callback: CallbackQuery):
-    habit_id = int(callback.data.split("_")[1])
+@habit_action(HabitAction.STATS)
+async def show_stats_periods(callback: CallbackQuery, callback_data: HabitCallback,
+                             state: FSMContext, session: AsyncSession):
+    habit_id = callback_data.habit_id
+
+    if not await is_habit_owner(session, habit_id, callback.from_user.id):
+        await callback.answer("Привычка не найдена")
+        return
 
     keyboard = stats_periods_kb(habit_id)
 
@@ -543,57 +518,102 @@ async def show_stats_periods(callback: CallbackQuery):
     await callback.answer()
 
 # Обработчик периода статистики
-@router.callback_query(lambda c: c.data.startswith("statsperiod_"))
-async def show_habit_stats(callback: CallbackQuery):
+@habit_action(HabitAction.STATS_PERIOD)
+async def show_habit_stats(callback: CallbackQuery, callback_data: HabitCallback,
+                           state: FSMContext, session: AsyncSession):
     await callback.answer()
-    parts = callback.data.split("_")
-    habit_id = int(parts[1])
-    days = int(parts[2])
-
-    async with async_session_maker() as session:
-        habit = await session.get(Habit, habit_id)
-        end_date = datetime.utcnow().date()
-        start_date = end_date - timedelta(days=days - 1)
-
-        # Получаем все логи за период
-        logs = await session.execute(
-            select(HabitLog.date)
-            .where(
-                HabitLog.habit_id == habit_id,
-                HabitLog.date >= start_date,
-                HabitLog.date <= end_date
-            )
-            .order_by(HabitLog.date)
-        )
-        log_dates = [log[0] for log in logs.fetchall()]
+    habit_id = callback_data.habit_id
+    days = callback_data.days
+    if days not in STATS_PERIODS:
+        return
 
-        # Считаем статистику
-        total_days = days
-        completed_days = len(log_dates)
-        completion_rate = int((completed_days / total_days) * 100) if total_days > 0 else 0
+    habit = await session.get(Habit, habit_id)
+    if not habit or habit.user_id != callback.from_user.id:
+        return
 
-        # Текущий стрик
-        current_streak = await calculate_streak(session, habit_id)
+    end_date = datetime.utcnow().date()
+    start_date = end_date - timedelta(days=days - 1)
 
-        # Формируем текстовую статистику
-        text = f"📊 <b>Статистика: {habit.name}</b>\n"
-        text += f"📅 Период: {days} дней\n\n"
-        text += f"✅ Выполнено: {completed_days}/{total_days} дней\n"
-        text += f"📈 Процент выполнения: {completion_rate}%\n"
-        text += f"🔥 Текущая серия: {current_streak} дней\n\n"
+    # Считаем статистику за период одним агрегатом (одна отметка на день)
+    totals = await session.execute(
+        select(
+            func.count(HabitLog.id),
+            func.sum(HabitLog.value),
+            func.avg(HabitLog.value),
+        )
+        .where(
+            HabitLog.habit_id == habit_id,
+            HabitLog.date >= start_date,
+            HabitLog.date <= end_date
+        )
+    )
+    completed_days, value_sum, value_avg = totals.one()
+
+    total_days = days
+    completion_rate = int((completed_days / total_days) * 100) if total_days > 0 else 0
+
+    # Текущий стрик
+    current_streak = displayed_streak(habit, end_date)
+
+    # Формируем текстовую статистику
+    text = f"📊 <b>Статистика: {habit.name}</b>\n"
+    text += f"📅 Период: {days} дней\n\n"
+    text += f"✅ Выполнено: {completed_days}/{total_days} дней\n"
+    text += f"📈 Процент выполнения: {completion_rate}%\n"
+    text += f"🔥 Текущая серия: {current_streak} дней\n"
+    text += f"🏆 Лучшая серия: {habit.longest_streak or 0} дней\n"
+    if habit.habit_type == "numeric":
+        unit = habit.numeric_unit or "раз"
+        text += f"🔢 Всего: {value_sum or 0} {unit}\n"
+        text += f"📐 В среднем за отметку: {float(value_avg or 0):.1f} {unit}\n"
+    text += "\n"
 
-        chart_buffer = await generate_habit_chart(habit, days)
+    # Дальше только Redis и Bot API — возвращаем соединение с БД в пул
+    await session.commit()
 
     # Кнопки
     keyboard = stats_navigation_kb(habit_id)
+    cache_key = chart_cache_key(habit, days, end_date)
 
-    # Отправляем фото с графиком
-    await callback.message.answer_photo(
-        BufferedInputFile(chart_buffer.getvalue(), filename='heatmap.png'),
-        caption=text,
-        parse_mode="HTML",
-        reply_markup=keyboard
-    )
+    # Этот график уже загружали — отправляем по file_id, без повторной загрузки PNG
+    file_id = await photo_file_ids.get(cache_key)
+    if file_id:
+        try:
+            await callback.message.answer_photo(
+                file_id,
+                caption=text,
+                parse_mode="HTML",
+                reply_markup=keyboard
+            )
+        except TelegramBadRequest:
+            await photo_file_ids.forget(cache_key)
+            file_id = None
+
+    if not file_id:
+        # График берём из кэша, пока данные привычки не менялись
+        chart_png = await chart_cache.get(cache_key)
+        if chart_png is None:
+            try:
+                with CHART_DURATION.labels(days).time():
+                    chart_png = await generate_habit_chart(session, habit, days)
+                CHART_BYTES.labels(CHART_FORMAT, days).observe(len(chart_png))
+            except (ChartQueueFull, ChartWorkerCrashed) as e:
+                if isinstance(e, ChartQueueFull):
+                    CHART_QUEUE_FULL.inc()
+                # Очередь графиков переполнена или процесс отрисовки упал — отдаём статистику текстом
+                text += "⏳ График сейчас недоступен, попробуйте через минуту."
+                await safe_edit_message(callback, text, keyboard, parse_mode="HTML")
+                return
+            await chart_cache.set(cache_key, chart_png)
+
+        # Отправляем фото с графиком и запоминаем его file_id
+        sent = await callback.message.answer_photo(
+            BufferedInputFile(chart_png, filename=chart_filename()),
+            caption=text,
+            parse_mode="HTML",
+            reply_markup=keyboard
+        )
+        await photo_file_ids.set(cache_key, sent.photo[-1].file_id)
 
     await callback.message.delete()
     await callback.answer()
@@ -601,9 +621,14 @@ async def show_habit_stats(callback: CallbackQuery):
 
 ## edit_ редактирование
 # Обработчик изменений в привычке
-@router.callback_query(lambda c: c.data.startswith("edit_"))
-async def start_edit_habit(callback: CallbackQuery, state: FSMContext):
-    habit_id = int(callback.data.split("_")[1])
+@habit_action(HabitAction.EDIT)
+async def start_edit_habit(callback: CallbackQuery, callback_data: HabitCallback,
+                           state: FSMContext, session: AsyncSession):
+    habit_id = callback_data.habit_id
+
+    if not await is_habit_owner(session, habit_id, callback.from_user.id):
+        await callback.answer("Привычка не найдена")
+        return
 
     # Сохраняем ID привычки и текущее сообщение
     await state.update_data(
@@ -619,29 +644,43 @@ async def start_edit_habit(callback: CallbackQuery, state: FSMContext):
 
 ## logdata_ пометки
 # Обработчик пометок к привычке
-@router.callback_query(lambda c: c.data.startswith("logdata_"))
-async def show_habit_notes(callback: CallbackQuery):
-    habit_id = int(callback.data.split("_")[1])
+@habit_action(HabitAction.NOTES)
+async def show_habit_notes(callback: CallbackQuery, callback_data: HabitCallback,
+                           state: FSMContext, session: AsyncSession):
+    habit_id = callback_data.habit_id
+
+    habit = await session.get(Habit, habit_id)
+    if not habit or habit.user_id != callback.from_user.id:
+        await callback.answer("Привычка не найдена")
+        return
 
-    async with async_session_maker() as session:
+    if habit.habit_type == "numeric":
+        # У числовых привычек показываем сами значения — пометки не нужны
+        unit = habit.numeric_unit or "раз"
+        query = (
+            select(HabitLog.date, func.concat(HabitLog.value, " ", unit))
+            .where(HabitLog.habit_id == habit_id, HabitLog.value.is_not(None))
+        )
+    else:
         # Получаем все логи с подписями для этой привычки
-        notes = await session.execute(
+        query = (
             select(HabitLog.date, HabitNote.text)
             .join(HabitNote, HabitLog.id == HabitNote.log_id)
             .where(HabitLog.habit_id == habit_id)
-            .order_by(HabitLog.date.desc())
-            .limit(20)  # последние 20 записей
         )
-        notes = notes.all()
-
-        habit = await session.get(Habit, habit_id)
+    notes = await session.execute(
+        query
+        .order_by(HabitLog.date.desc())
+        .limit(20)  # последние 20 записей
+    )
+    notes = notes.all()
 
-        if not notes:
-            text = f"📝 Пометки к привычке «{habit.name}»\n\nПометок пока нет."
-        else:
-            text = f"📝 Пометки к привычке «{habit.name}»\n\n"
-            for date, note_text in notes:
-                text += f"• {date.strftime('%d.%m.%Y')}: {note_text}\n"
+    if not notes:
+        text = f"📝 Пометки к привычке «{habit.name}»\n\nПометок пока нет."
+    else:
+        text = f"📝 Пометки к привычке «{habit.name}»\n\n"
+        for date, note_text in notes:
+            text += f"• {date.strftime('%d.%m.%Y')}: {note_text}\n"
 
     # Кнопка возврата
     keyboard = habit_notes_back_kb(habit_id)
@@ -651,32 +690,27 @@ async def show_habit_notes(callback: CallbackQuery):
 
 
 ## notes_ выбор подписей
-@router.callback_query(lambda c: c.data in ["notes_yes", "notes_no", "cancel_new_habit"])
-async def process_notes_choice(callback: CallbackQuery, state: FSMContext):
-    if callback.data == "cancel_new_habit":
-        await state.clear()
-        await callback.message.edit_text("❌ Создание привычки отменено.")
-        await callback.answer()
-        return
-
+@habit_action(HabitAction.NOTES_ON, HabitAction.NOTES_OFF)
+async def process_notes_choice(callback: CallbackQuery, callback_data: HabitCallback,
+                               state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     habit_name = data['habit_name']
-    allow_notes = (callback.data == "notes_yes")
+    allow_notes = (callback_data.action == HabitAction.NOTES_ON)
     habit_type_str = data.get('habit_type', 'type_boolean')
     numeric_unit = data.get('numeric_unit')
 
     habit_type_value = "numeric" if habit_type_str == 'type_numeric' else "boolean"
 
-    async with async_session_maker() as session:
-        habit = Habit(
-            user_id=callback.from_user.id,
-            name=habit_name,
-            allow_notes=allow_notes,
-            habit_type=habit_type_value,
-            numeric_unit=numeric_unit
-        )
-        session.add(habit)
-        await session.commit()
+    habit = Habit(
+        user_id=callback.from_user.id,
+        name=habit_name,
+        allow_notes=allow_notes,
+        habit_type=habit_type_value,
+        numeric_unit=numeric_unit
+    )
+    session.add(habit)
+    await session.commit()
+    identity_cache.put_habit(habit)
 
     note_text = "с подписями" if allow_notes else "без подписей"
     await callback.message.edit_text(f"✅ Привычка «{habit_name}» создана ({note_text})!")
@@ -718,56 +752,60 @@ async def process_habit_type(callback: CallbackQuery, state: FSMContext):
 
 # Обработка единиц измерения
 @router.message(HabitForm.waiting_for_numeric_unit)
-async def process_numeric_unit(message: Message, state: FSMContext):
+async def process_numeric_unit(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     habit_name = data['habit_name']
     numeric_unit = message.text.strip()
 
-    async with async_session_maker() as session:
-        habit = Habit(
-            user_id=message.from_user.id,
-            name=habit_name,
-            habit_type="numeric",
-            numeric_unit=numeric_unit,
-            allow_notes=False
-        )
-        session.add(habit)
-        await session.commit()
+    habit = Habit(
+        user_id=message.from_user.id,
+        name=habit_name,
+        habit_type="numeric",
+        numeric_unit=numeric_unit,
+        allow_notes=False
+    )
+    session.add(habit)
+    await session.commit()
+    identity_cache.put_habit(habit)
 
     await message.answer(f"✅ Привычка «{habit_name}» создана (отслеживаем количество {numeric_unit})!")
     await state.clear()
 
 # Обработчик для ввода подписи к отметке
 @router.message(HabitLogForm.waiting_for_note)
-async def process_habit_note(message: Message, state: FSMContext):
+async def process_habit_note(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     habit_id = data['habit_id']
     today = datetime.fromisoformat(data['today']).date()
     note_text = message.text.strip() if message.text.strip() != "-" else ""
 
-    async with async_session_maker() as session:
-        # Создаём запись о выполнении
-        log = HabitLog(habit_id=habit_id, date=today)
-        session.add(log)
-        await session.flush()
+    habit = await session.get(Habit, habit_id)
 
-        # Если подпись не пустая — сохраняем
-        if note_text:
-            note = HabitNote(log_id=log.id, text=note_text)
-            session.add(note)
+    # Создаём запись о выполнении (None — день уже отмечен, например с другого устройства)
+    log_id = await insert_habit_log(session, habit, today)
+    if log_id is None:
+        await message.answer("✅ Уже отмечено сегодня!")
+        await state.clear()
+        return
 
-        await session.commit()
+    # Если подпись не пустая — сохраняем
+    if note_text:
+        note = HabitNote(log_id=log_id, text=note_text)
+        session.add(note)
 
-        # Возвращаемся в меню привычки
-        habit = await session.get(Habit, habit_id)
-        text, keyboard = await build_habit_menu(session, habit)
+    await record_completion(session, habit, today)
+    await mark_habit_changed(session, habit)
+    await session.commit()
+
+    # Возвращаемся в меню привычки
+    text, keyboard = await build_habit_menu(session, habit)
 
     await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
     await state.clear()
 
 # Обработчик нового названия
 @router.message(EditHabitForm.waiting_for_new_name)
-async def finish_edit_habit(message: Message, state: FSMContext):
+async def finish_edit_habit(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     habit_id = data['habit_id']
     new_name = message.text.strip()
@@ -776,50 +814,50 @@ async def finish_edit_habit(message: Message, state: FSMContext):
         await message.answer("Название не может быть пустым. Попробуйте ещё раз:")
         return
 
-    async with async_session_maker() as session:
-        # Получаем и обновляем привычку
-        habit = await session.get(Habit, habit_id)
-        if habit and habit.user_id == message.from_user.id:
-            habit.name = new_name
-            await session.commit()
+    # Получаем и обновляем привычку
+    habit = await session.get(Habit, habit_id)
+    if habit and habit.user_id == message.from_user.id:
+        habit.name = new_name
+        await mark_habit_changed(session, habit)
+        await session.commit()
 
-            # Обновляем меню привычки
-            text, keyboard = await build_habit_menu(session, habit)
-            await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
-        else:
-            await message.answer("Ошибка: привычка не найдена.")
+        # Обновляем меню привычки
+        text, keyboard = await build_habit_menu(session, habit)
+        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+    else:
+        await message.answer("Ошибка: привычка не найдена.")
 
     await state.clear()
 
 # Обработчик числа
 @router.message(NumericLogForm.waiting_for_numeric_value)
-async def process_numeric_value(message: Message, state: FSMContext):
+async def process_numeric_value(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     habit_id = data['habit_id']
     today = datetime.fromisoformat(data['today']).date()
 
     try:
         value = int(message.text.strip())
-        if value <= 0:
+        # habit_logs.value — integer (32 бита)
+        if value <= 0 or value > MAX_NUMERIC_VALUE:
             raise ValueError
     except ValueError:
         await message.answer("Пожалуйста, введите целое положительное число:")
         return
 
-    async with async_session_maker() as session:
-        log = HabitLog(habit_id=habit_id, date=today)
-        session.add(log)
-        await session.flush()
+    habit = await session.get(Habit, habit_id)
 
-        habit = await session.get(Habit, habit_id)
-        unit = habit.numeric_unit or "раз"
-        note_text = f"{value} {unit}"
+    # Количество хранится в самой отметке
+    if await insert_habit_log(session, habit, today, value) is None:
+        await message.answer("✅ Уже отмечено сегодня!")
+        await state.clear()
+        return
 
-        note = HabitNote(log_id=log.id, text=note_text)
-        session.add(note)
-        await session.commit()
+    await record_completion(session, habit, today)
+    await mark_habit_changed(session, habit)
+    await session.commit()
 
-        text, keyboard = await build_habit_menu(session, habit)
+    text, keyboard = await build_habit_menu(session, habit)
 
     await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
     await state.clear()
\ No newline at end of file
@@ -3,29 +3,37 @@ import re
 from aiogram import Router
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
-from bot.database.engine import async_session_maker
-from bot.database.models import User
-from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from bot.keyboards.reply import main_kb
 from bot.keyboards.inline import settings_kb, timezone_selection_kb, time_selection_kb
-from celery_worker.tasks import schedule_user_reminder, cancel_user_reminders
+from bot.keyboards.inline import SettingsAction, SettingsCallback
+from bot.services.identity_cache import identity_cache
+from bot.services.reminders import reminder_minute_utc
 
-router = Router()
+router = Router(name="settings")
 
 class SettingsForm(StatesGroup):
     waiting_for_custom_timezone = State()
     waiting_for_custom_time = State()
 
+
+# Обработчики кнопок настроек по коду действия (см. SettingsCallback)
+SETTINGS_ACTIONS = {}
+
+
+# Регистрирует обработчик кнопки в таблице SETTINGS_ACTIONS
+def settings_action(action: SettingsAction):
+    def register(handler):
+        SETTINGS_ACTIONS[action] = handler
+        return handler
+    return register
+
 @router.message(lambda message: message.text == '⚙️ Настройки')
 @router.message(Command('settings'))
-async def cmd_settings(message: Message):
-    async with async_session_maker() as session:
-        user = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        user = user.scalar_one_or_none()
+async def cmd_settings(message: Message, session: AsyncSession):
+    user = await identity_cache.get_user(session, message.from_user.id)
 
     if not user:
         return
@@ -42,8 +50,16 @@ async def cmd_settings(message: Message):
 
     await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
 
-@router.callback_query(lambda c: c.data == "change_timezone")
-async def change_timezone_start(callback: CallbackQuery):
+# Все кнопки настроек приходят в один обработчик и выбираются по коду действия
+@router.callback_query(SettingsCallback.filter())
+async def dispatch_settings_callback(callback: CallbackQuery, callback_data: SettingsCallback,
+                                     state: FSMContext, session: AsyncSession):
+    handler = SETTINGS_ACTIONS[callback_data.action]
+    await handler(callback, callback_data, state, session)
+
+@settings_action(SettingsAction.TIMEZONE_MENU)
+async def change_timezone_start(callback: CallbackQuery, callback_data: SettingsCallback,
+                                state: FSMContext, session: AsyncSession):
     keyboard = timezone_selection_kb()
 
     await callback.message.edit_text(
@@ -52,22 +68,22 @@ async def change_timezone_start(callback: CallbackQuery):
     )
     await callback.answer()
 
-@router.callback_query(lambda c: c.data.startswith("tz_"))
-async def change_timezone_finish(callback: CallbackQuery, state: FSMContext):
-    tz_value = callback.data.replace("tz_", "")
+@settings_action(SettingsAction.TIMEZONE)
+async def change_timezone_finish(callback: CallbackQuery, callback_data: SettingsCallback,
+                                 state: FSMContext, session: AsyncSession):
+    tz_value = callback_data.value
 
     if tz_value == "custom":
         await callback.message.answer("Введите ваш часовой пояс в формате UTC±XX (например, UTC+5):")
         await state.set_state(SettingsForm.waiting_for_custom_timezone)
         return
 
-    async with async_session_maker() as session:
-        user = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = user.scalar_one()
-        user.timezone = tz_value
-        await session.commit()
+    user = await identity_cache.get_user(session, callback.from_user.id)
+    await identity_cache.update_user(
+        session, user.telegram_id,
+        timezone=tz_value,
+        reminder_minute_utc=reminder_minute_utc(user.reminder_time, tz_value),
+    )
 
     await callback.message.edit_text(
         f"✅ Часовой пояс изменён на <b>{tz_value}</b>",
@@ -76,7 +92,7 @@ async def change_timezone_finish(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.message(SettingsForm.waiting_for_custom_timezone)
-async def process_custom_timezone_input(message: Message, state: FSMContext):
+async def process_custom_timezone_input(message: Message, state: FSMContext, session: AsyncSession):
     tz_pattern = r'^UTC([+-])(0?[0-9]|1[0-4])$'
     match = re.match(tz_pattern, message.text.strip())
 
@@ -91,13 +107,12 @@ async def process_custom_timezone_input(message: Message, state: FSMContext):
     sign, hours = match.groups()
     tz_value = f"UTC{sign}{int(hours):02d}"
 
-    async with async_session_maker() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        user = result.scalar_one()
-        user.timezone = tz_value
-        await session.commit()
+    user = await identity_cache.get_user(session, message.from_user.id)
+    user = await identity_cache.update_user(
+        session, user.telegram_id,
+        timezone=tz_value,
+        reminder_minute_utc=reminder_minute_utc(user.reminder_time, tz_value),
+    )
 
     await state.clear()
 
@@ -110,8 +125,9 @@ async def process_custom_timezone_input(message: Message, state: FSMContext):
         reply_markup=keyboard
     )
 
-@router.callback_query(lambda c: c.data == "change_reminder_time")
-async def change_reminder_time_start(callback: CallbackQuery):
+@settings_action(SettingsAction.REMINDER_TIME_MENU)
+async def change_reminder_time_start(callback: CallbackQuery, callback_data: SettingsCallback,
+                                     state: FSMContext, session: AsyncSession):
     keyboard = time_selection_kb()
 
     await callback.message.edit_text(
@@ -120,9 +136,10 @@ async def change_reminder_time_start(callback: CallbackQuery):
     )
     await callback.answer()
 
-@router.callback_query(lambda c: c.data.startswith("remtime_"))
-async def change_reminder_time_finish(callback: CallbackQuery, state: FSMContext):
-    time_value = callback.data.replace("remtime_", "")
+@settings_action(SettingsAction.REMINDER_TIME)
+async def change_reminder_time_finish(callback: CallbackQuery, callback_data: SettingsCallback,
+                                      state: FSMContext, session: AsyncSession):
+    time_value = callback_data.value
 
     if time_value == "custom":
         await callback.message.answer(
@@ -136,21 +153,13 @@ async def change_reminder_time_finish(callback: CallbackQuery, state: FSMContext
         await callback.answer("❌ Неверный формат времени. Используйте ЧЧ:ММ", show_alert=True)
         return
 
-    async with async_session_maker() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = result.scalar_one()
-        user.reminder_time = time_value
-        await session.commit()
-
-    cancel_user_reminders.delay(user_id=callback.from_user.id)
-    if user.reminders_enabled:
-        schedule_user_reminder.delay(
-            user_id=callback.from_user.id,
-            reminder_time=time_value,
-            timezone=user.timezone
-        )
+    user = await identity_cache.get_user(session, callback.from_user.id)
+    # Новое время сразу подхватит периодическая задача рассылки
+    user = await identity_cache.update_user(
+        session, user.telegram_id,
+        reminder_time=time_value,
+        reminder_minute_utc=reminder_minute_utc(time_value, user.timezone),
+    )
 
     await callback.message.edit_text(
         f"✅ Время напоминаний изменено на <b>{time_value}</b>\n"
@@ -160,7 +169,7 @@ async def change_reminder_time_finish(callback: CallbackQuery, state: FSMContext
     await callback.answer()
 
 @router.message(SettingsForm.waiting_for_custom_time)
-async def process_custom_time_input(message: Message, state: FSMContext):
+async def process_custom_time_input(message: Message, state: FSMContext, session: AsyncSession):
     time_pattern = r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$'
 
     if not re.match(time_pattern, message.text):
@@ -172,21 +181,13 @@ async def process_custom_time_input(message: Message, state: FSMContext):
 
     time_value = message.text
 
-    async with async_session_maker() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        user = result.scalar_one()
-        user.reminder_time = time_value
-        await session.commit()
-
-    cancel_user_reminders.delay(user_id=message.from_user.id)
-    if user.reminders_enabled:
-        schedule_user_reminder.delay(
-            user_id=message.from_user.id,
-            reminder_time=time_value,
-            timezone=user.timezone
-        )
+    user = await identity_cache.get_user(session, message.from_user.id)
+    # Новое время сразу подхватит периодическая задача рассылки
+    user = await identity_cache.update_user(
+        session, user.telegram_id,
+        reminder_time=time_value,
+        reminder_minute_utc=reminder_minute_utc(time_value, user.timezone),
+    )
 
     await state.clear()
 
@@ -199,29 +200,21 @@ async def process_custom_time_input(message: Message, state: FSMContext):
         reply_markup=keyboard
     )
 
-@router.callback_query(lambda c: c.data == "toggle_reminders")
-async def toggle_reminders(callback: CallbackQuery):
-    async with async_session_maker() as session:
-        user = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = user.scalar_one()
-
-        new_status = not user.reminders_enabled
-        user.reminders_enabled = new_status
-
-        if new_status:
-            schedule_user_reminder.delay(
-                user_id=callback.from_user.id,
-                reminder_time=user.reminder_time,
-                timezone=user.timezone
-            )
-        else:
-            cancel_user_reminders.delay(user_id=callback.from_user.id)
-
-        await session.commit()
+@settings_action(SettingsAction.TOGGLE_REMINDERS)
+async def toggle_reminders(callback: CallbackQuery, callback_data: SettingsCallback,
+                           state: FSMContext, session: AsyncSession):
+    user = await identity_cache.get_user(session, callback.from_user.id)
+
+    # Рассылку делает периодическая задача по флагу в БД:
+    # выключение — это и есть отмена, ничего не остаётся в очереди
+    new_status = not user.reminders_enabled
+    user = await identity_cache.update_user(
+        session, user.telegram_id,
+        reminders_enabled=new_status,
+        reminder_minute_utc=reminder_minute_utc(user.reminder_time, user.timezone),
+    )
 
-        status = "включены" if new_status else "выключены"
+    status = "включены" if new_status else "выключены"
 
     await callback.message.edit_text(
         f"✅ Напоминания <b>{status}</b>\n\n"
@@ -230,8 +223,9 @@ async def toggle_reminders(callback: CallbackQuery):
     )
     await callback.answer()
 
-@router.callback_query(lambda c: c.data == "back_to_main")
-async def back_to_main_settings(callback: CallbackQuery):
+@settings_action(SettingsAction.BACK)
+async def back_to_main_settings(callback: CallbackQuery, callback_data: SettingsCallback,
+                                state: FSMContext, session: AsyncSession):
     await callback.message.answer(
         "Главное меню:",
         reply_markup=main_kb(),
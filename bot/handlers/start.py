@@ -3,32 +3,28 @@ from aiogram.filters import CommandStart
 from aiogram.types import Message
 from bot.keyboards.reply import main_kb
 from bot.database.models import User
-from bot.database.engine import async_session_maker
-from sqlalchemy import select
+from bot.services.identity_cache import identity_cache
+from sqlalchemy.ext.asyncio import AsyncSession
 
-router = Router()
+router = Router(name="start")
 
 
 @router.message(CommandStart())
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, session: AsyncSession):
     try:
-        async with async_session_maker() as session:
-            async with session.begin():
-                # Проверяем, есть ли пользователь
-                existing = await session.execute(
-                    select(User).where(User.telegram_id == message.from_user.id)
-                )
-                user = existing.scalar_one_or_none()
+        # Проверяем, есть ли пользователь
+        user = await identity_cache.get_user(session, message.from_user.id)
 
-                # Если нет — регистрируем
-                if not user:
-                    user = User(
-                        telegram_id=message.from_user.id,
-                        username=message.from_user.username,
-                        full_name=f"{message.from_user.first_name} {message.from_user.last_name or ''}".strip(),
-                    )
-                    session.add(user)
-                    # commit() вызывается автоматически при выходе из блока
+        # Если нет — регистрируем
+        if not user:
+            user = User(
+                telegram_id=message.from_user.id,
+                username=message.from_user.username,
+                full_name=f"{message.from_user.first_name} {message.from_user.last_name or ''}".strip(),
+            )
+            session.add(user)
+            await session.commit()
+            identity_cache.put_user(user)
 
         await message.answer(
             f"Привет, {message.from_user.first_name}! 👋\nЯ твой помощник в формировании привычек.",
@@ -36,5 +32,6 @@ async def cmd_start(message: Message):
         )
 
     except Exception as e:
+        await session.rollback()
         await message.answer("Произошла ошибка. Попробуйте позже.")
-        print(f"Error: {e}")
\ No newline at end of file
+        print(f"Error: {e}")
@@ -0,0 +1,69 @@
+import asyncio
+import hmac
+import logging
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError
+from redis.exceptions import RedisError
+
+from bot.services.redis_client import close_redis
+from bot.services.update_stream import publish_update
+from config import WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_DELETE_ON_SHUTDOWN
+
+logger = logging.getLogger(__name__)
+
+# Приём апдейтов без обработки: апдейт сразу уходит в поток Redis своего раздела,
+# обрабатывают его процессы python -m bot.worker (см. bot/worker.py)
+
+
+# РЕЖИМ WEBHOOK
+def create_ingest_app(bot: Bot, allowed_updates: list) -> web.Application:
+    if not WEBHOOK_BASE_URL or not WEBHOOK_SECRET:
+        raise RuntimeError("Для BOT_MODE=webhook нужны WEBHOOK_BASE_URL и WEBHOOK_SECRET")
+
+    async def handle_update(request: web.Request) -> web.Response:
+        secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(secret, WEBHOOK_SECRET):
+            return web.Response(status=401)
+        await publish_update(await request.json())
+        return web.Response()
+
+    async def on_startup(app: web.Application):
+        await bot.set_webhook(
+            f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=allowed_updates,
+        )
+
+    async def on_shutdown(app: web.Application):
+        if WEBHOOK_DELETE_ON_SHUTDOWN:
+            await bot.delete_webhook()
+        await bot.session.close()
+        await close_redis()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+
+# РЕЖИМ POLLING
+async def run_ingest_polling(bot: Bot, allowed_updates: list):
+    await bot.delete_webhook()
+    offset = None
+    try:
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed_updates)
+                for update in updates:
+                    await publish_update(update.model_dump(mode="json", by_alias=True, exclude_unset=True))
+                    # смещение двигаем только после записи в поток — апдейт не потеряется
+                    offset = update.update_id + 1
+            except (TelegramNetworkError, RedisError) as e:
+                logger.warning("Приём апдейтов прерван: %s", e)
+                await asyncio.sleep(1)
+    finally:
+        await bot.session.close()
+        await close_redis()
@@ -1,13 +1,65 @@
+from enum import Enum
+
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+
+# Периоды общей статистики, дней (первый — по умолчанию)
+GENERAL_STATS_PERIODS = (7, 30, 90, 365)
+
+
+# БЛОК CALLBACK DATA
+# Коды действий короткие: callback_data ограничена 64 байтами
+class HabitAction(str, Enum):
+    MENU = "m"
+    LIST = "ls"
+    NEW = "n"
+    CANCEL_NEW = "x"
+    NOTES_ON = "ny"
+    NOTES_OFF = "nn"
+    LOG = "l"
+    UNLOG = "u"
+    DELETE = "d"
+    CONFIRM_DELETE = "dy"
+    CANCEL_DELETE = "dn"
+    STATS = "s"
+    STATS_PERIOD = "sp"
+    GENERAL_STATS = "g"
+    EDIT = "e"
+    NOTES = "nt"
+
+
+class HabitCallback(CallbackData, prefix="h"):
+    """Кнопки привычек: h:<действие>:<id привычки>:<дней>"""
+    action: HabitAction
+    habit_id: int = 0
+    days: int = 0
+
+
+class SettingsAction(str, Enum):
+    TIMEZONE_MENU = "tzm"
+    TIMEZONE = "tz"
+    REMINDER_TIME_MENU = "rtm"
+    REMINDER_TIME = "rt"
+    TOGGLE_REMINDERS = "r"
+    BACK = "b"
+
+
+# Разделитель "|": в значениях бывает время вида 08:00
+class SettingsCallback(CallbackData, prefix="st", sep="|"):
+    """Кнопки настроек: st|<действие>|<значение>"""
+    action: SettingsAction
+    value: str = ""
+
+
 # БЛОК SETTINGS
 # Динамическая клавиатура настроек.
 def settings_kb(user, time_value=None):
     rows = [
-        [InlineKeyboardButton(text="🕐 Изменить часовой пояс", callback_data="change_timezone")],
+        [InlineKeyboardButton(text="🕐 Изменить часовой пояс", callback_data=SettingsCallback(action=SettingsAction.TIMEZONE_MENU).pack())],
         [InlineKeyboardButton(
             text=f"{'🔕 Выкл' if user.reminders_enabled else '🔔 Вкл'} напоминания",
-            callback_data="toggle_reminders"
+            callback_data=SettingsCallback(action=SettingsAction.TOGGLE_REMINDERS).pack()
         )]
     ]
 
@@ -18,21 +70,21 @@ def settings_kb(user, time_value=None):
         rows.append([
             InlineKeyboardButton(
                 text=f"⏰ Время: {display_time}",
-                callback_data="change_reminder_time"
+                callback_data=SettingsCallback(action=SettingsAction.REMINDER_TIME_MENU).pack()
             )
         ])
 
-    rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_main")])
+    rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data=SettingsCallback(action=SettingsAction.BACK).pack())])
 
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 # Клавиатура выбора часового пояса
 def timezone_selection_kb():
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Москва (UTC+3)", callback_data="tz_UTC+3")],
-        [InlineKeyboardButton(text="Калининград (UTC+2)", callback_data="tz_UTC+2")],
-        [InlineKeyboardButton(text="Астана (UTC+5)", callback_data="tz_UTC+5")],
-        [InlineKeyboardButton(text="Другой...", callback_data="tz_custom")]
+        [InlineKeyboardButton(text="Москва (UTC+3)", callback_data=SettingsCallback(action=SettingsAction.TIMEZONE, value="UTC+3").pack())],
+        [InlineKeyboardButton(text="Калининград (UTC+2)", callback_data=SettingsCallback(action=SettingsAction.TIMEZONE, value="UTC+2").pack())],
+        [InlineKeyboardButton(text="Астана (UTC+5)", callback_data=SettingsCallback(action=SettingsAction.TIMEZONE, value="UTC+5").pack())],
+        [InlineKeyboardButton(text="Другой...", callback_data=SettingsCallback(action=SettingsAction.TIMEZONE, value="custom").pack())]
     ])
 
 # Клавиатура выбора времени напоминаний
@@ -43,7 +95,7 @@ def time_selection_kb():
     row = []
 
     for i, time in enumerate(times):
-        row.append(InlineKeyboardButton(text=time, callback_data=f"remtime_{time}"))
+        row.append(InlineKeyboardButton(text=time, callback_data=SettingsCallback(action=SettingsAction.REMINDER_TIME, value=time).pack()))
         if (i + 1) % 3 == 0:  # по 3 кнопки в строке
             keyboard_buttons.append(row)
             row = []
@@ -52,7 +104,7 @@ def time_selection_kb():
         keyboard_buttons.append(row)
 
     keyboard_buttons.append([
-        InlineKeyboardButton(text="✏️ Другое время...", callback_data="remtime_custom")
+        InlineKeyboardButton(text="✏️ Другое время...", callback_data=SettingsCallback(action=SettingsAction.REMINDER_TIME, value="custom").pack())
     ])
 
     return InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
@@ -66,7 +118,7 @@ def habits_list_kb(habits_with_streaks):
         Клавиатура со списком привычек.
 
         :param habits_with_streaks: Список кортежей (habit, streak_text)
-        Пример: [(habit1, "🔥5"), (habit2, ""), ...]
+        Пример: [(habit1, " ✅ 🔥5"), (habit2, ""), ...] (✅ — отмечена сегодня)
     """
     keyboard = []
 
@@ -75,7 +127,7 @@ def habits_list_kb(habits_with_streaks):
         keyboard.append([
             InlineKeyboardButton(
                 text=button_text,
-                callback_data=f"habit_{habit.id}"
+                callback_data=HabitCallback(action=HabitAction.MENU, habit_id=habit.id).pack()
             )
         ])
 
@@ -83,7 +135,7 @@ def habits_list_kb(habits_with_streaks):
     keyboard.append([
         InlineKeyboardButton(
             text="➕ Новая привычка",
-            callback_data="new_habit"
+            callback_data=HabitCallback(action=HabitAction.NEW).pack()
         )
     ])
 
@@ -104,33 +156,33 @@ def habit_menu_kb(habit_id, is_today_logged):
         keyboard.append([
             InlineKeyboardButton(
                 text="❌ Отменить сегодняшнюю отметку",
-                callback_data=f"unlog_{habit_id}"
+                callback_data=HabitCallback(action=HabitAction.UNLOG, habit_id=habit_id).pack()
             )
         ])
     else:
         keyboard.append([
             InlineKeyboardButton(
                 text="✅ Отметить выполнение сегодня",
-                callback_data=f"log_{habit_id}"
+                callback_data=HabitCallback(action=HabitAction.LOG, habit_id=habit_id).pack()
             )
         ])
 
     # Ряд с управлением
     keyboard.append([
-        InlineKeyboardButton(text="📊 Статистика", callback_data=f"stats_{habit_id}"),
-        InlineKeyboardButton(text="📝 Пометки по дням", callback_data=f"logdata_{habit_id}")
+        InlineKeyboardButton(text="📊 Статистика", callback_data=HabitCallback(action=HabitAction.STATS, habit_id=habit_id).pack()),
+        InlineKeyboardButton(text="📝 Пометки по дням", callback_data=HabitCallback(action=HabitAction.NOTES, habit_id=habit_id).pack())
     ])
 
     keyboard.append([
-        InlineKeyboardButton(text="✏️ Изменить", callback_data=f"edit_{habit_id}"),
-        InlineKeyboardButton(text="🗑️ Удалить", callback_data=f"delete_{habit_id}")
+        InlineKeyboardButton(text="✏️ Изменить", callback_data=HabitCallback(action=HabitAction.EDIT, habit_id=habit_id).pack()),
+        InlineKeyboardButton(text="🗑️ Удалить", callback_data=HabitCallback(action=HabitAction.DELETE, habit_id=habit_id).pack())
     ])
 
     # Кнопка возврата
     keyboard.append([
         InlineKeyboardButton(
             text="⬅️ Назад к списку",
-            callback_data="back_to_list"
+            callback_data=HabitCallback(action=HabitAction.LIST).pack()
         )
     ])
 
@@ -148,9 +200,9 @@ def habit_type_selection_kb():
 def habit_notes_selection_kb():
     """Клавиатура выбора подписей для булевой привычки."""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Да", callback_data="notes_yes")],
-        [InlineKeyboardButton(text="❌ Нет", callback_data="notes_no")],
-        [InlineKeyboardButton(text="🚫 Отмена", callback_data="cancel_new_habit")]
+        [InlineKeyboardButton(text="✅ Да", callback_data=HabitCallback(action=HabitAction.NOTES_ON).pack())],
+        [InlineKeyboardButton(text="❌ Нет", callback_data=HabitCallback(action=HabitAction.NOTES_OFF).pack())],
+        [InlineKeyboardButton(text="🚫 Отмена", callback_data=HabitCallback(action=HabitAction.CANCEL_NEW).pack())]
     ])
 
 # Клавиатура подтверждения удаления привычки.
@@ -158,8 +210,8 @@ def delete_confirmation_kb(habit_id):
     """Клавиатура подтверждения удаления привычки."""
     return InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="✅ Да, удалить", callback_data=f"confirm_delete_{habit_id}"),
-            InlineKeyboardButton(text="❌ Нет, отмена", callback_data=f"cancel_delete_{habit_id}")
+            InlineKeyboardButton(text="✅ Да, удалить", callback_data=HabitCallback(action=HabitAction.CONFIRM_DELETE, habit_id=habit_id).pack()),
+            InlineKeyboardButton(text="❌ Нет, отмена", callback_data=HabitCallback(action=HabitAction.CANCEL_DELETE, habit_id=habit_id).pack())
         ]
     ])
 
@@ -167,17 +219,19 @@ def delete_confirmation_kb(habit_id):
 def habit_notes_back_kb(habit_id):
     """Клавиатура возврата из просмотра пометок в меню привычки."""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="⬅️ Назад к привычке", callback_data=f"habit_{habit_id}")]
+        [InlineKeyboardButton(text="⬅️ Назад к привычке", callback_data=HabitCallback(action=HabitAction.MENU, habit_id=habit_id).pack())]
     ])
 
 # Клавиатура выбора периода статистики.
 def stats_periods_kb(habit_id):
     """Клавиатура выбора периода статистики."""
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📈 7 дней", callback_data=f"statsperiod_{habit_id}_7")],
-        [InlineKeyboardButton(text="📊 14 дней", callback_data=f"statsperiod_{habit_id}_14")],
-        [InlineKeyboardButton(text="📉 31 день", callback_data=f"statsperiod_{habit_id}_31")],
-        [InlineKeyboardButton(text="⬅️ Назад", callback_data=f"habit_{habit_id}")]
+        [InlineKeyboardButton(text="📈 7 дней", callback_data=HabitCallback(action=HabitAction.STATS_PERIOD, habit_id=habit_id, days=7).pack())],
+        [InlineKeyboardButton(text="📊 14 дней", callback_data=HabitCallback(action=HabitAction.STATS_PERIOD, habit_id=habit_id, days=14).pack())],
+        [InlineKeyboardButton(text="📉 31 день", callback_data=HabitCallback(action=HabitAction.STATS_PERIOD, habit_id=habit_id, days=31).pack())],
+        [InlineKeyboardButton(text="📆 90 дней", callback_data=HabitCallback(action=HabitAction.STATS_PERIOD, habit_id=habit_id, days=90).pack())],
+        [InlineKeyboardButton(text="🗓 Календарь за год", callback_data=HabitCallback(action=HabitAction.STATS_PERIOD, habit_id=habit_id, days=365).pack())],
+        [InlineKeyboardButton(text="⬅️ Назад", callback_data=HabitCallback(action=HabitAction.MENU, habit_id=habit_id).pack())]
     ])
 
 # Клавиатура навигации в статистике
@@ -185,9 +239,22 @@ def stats_navigation_kb(habit_id):
     """Клавиатура навигации в статистике (смена периода + возврат)."""
     return InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="7 дней", callback_data=f"statsperiod_{habit_id}_7"),
-            InlineKeyboardButton(text="14 дней", callback_data=f"statsperiod_{habit_id}_14"),
-            InlineKeyboardButton(text="31 день", callback_data=f"statsperiod_{habit_id}_31")
+            InlineKeyboardButton(text="7 дней", callback_data=HabitCallback(action=HabitAction.STATS_PERIOD, habit_id=habit_id, days=7).pack()),
+            InlineKeyboardButton(text="14 дней", callback_data=HabitCallback(action=HabitAction.STATS_PERIOD, habit_id=habit_id, days=14).pack()),
+            InlineKeyboardButton(text="31 день", callback_data=HabitCallback(action=HabitAction.STATS_PERIOD, habit_id=habit_id, days=31).pack()),
+            InlineKeyboardButton(text="90 дней", callback_data=HabitCallback(action=HabitAction.STATS_PERIOD, habit_id=habit_id, days=90).pack())
         ],
-        [InlineKeyboardButton(text="⬅️ Назад к привычке", callback_data=f"habit_{habit_id}")]
-    ])
\ No newline at end of file
+        [InlineKeyboardButton(text="🗓 Календарь за год", callback_data=HabitCallback(action=HabitAction.STATS_PERIOD, habit_id=habit_id, days=365).pack())],
+        [InlineKeyboardButton(text="⬅️ Назад к привычке", callback_data=HabitCallback(action=HabitAction.MENU, habit_id=habit_id).pack())]
+    ])
+# Клавиатура периодов общей статистики
+def general_stats_kb(current_days):
+    """Клавиатура периодов общей статистики (текущий период отмечен точкой)."""
+    buttons = [
+        InlineKeyboardButton(
+            text=f"{'• ' if days == current_days else ''}{days} дней",
+            callback_data=HabitCallback(action=HabitAction.GENERAL_STATS, days=days).pack()
+        )
+        for days in GENERAL_STATS_PERIODS
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
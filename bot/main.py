@@ -1,25 +1,151 @@
 import asyncio
 import logging
+from aiohttp import web
 from aiogram import Bot, Dispatcher
-from config import BOT_TOKEN
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from config import BOT_TOKEN, REDIS_URL, FSM_STORAGE, FSM_STATE_TTL, FSM_DATA_TTL
+from config import (
+    BOT_MODE, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_DELETE_ON_SHUTDOWN,
+    WEBAPP_HOST, WEBAPP_PORT, UPDATE_FANOUT, METRICS_PORT,
+)
+from config import QUERY_BUDGET, QUERY_BUDGET_LIMIT, QUERY_REPEAT_LIMIT, CHART_WARMUP
 
 # Импортируем роутеры
+from bot.handlers.admin import router as admin_router
 from bot.handlers.start import router as start_router
 from bot.handlers.habits import router as habits_router
 from bot.handlers.settings import router as settings_router
+from bot.handlers.fallback import router as fallback_router
+from bot.database.engine import async_session_maker, engine
+from bot.middlewares.db import DbSessionMiddleware
+from bot.middlewares.metrics import BotApiMetricsMiddleware, HandlerMetricsMiddleware
+from bot.middlewares.profiling import ProfilingMiddleware
+from bot.middlewares.query_budget import QueryBudgetMiddleware
+from bot.services.charts import chart_renderer
+from bot.services.identity_cache import identity_cache
+from bot.services.metrics import instrument_engine, start_metrics_server
+from bot.services.profiling import update_profiler
+from bot.services.query_budget import watch_engine
+from bot.services.redis_client import close_redis
+from bot.services.warmup import warm_up_in_background
 
 logging.basicConfig(level=logging.INFO)
 
+
+# Хранилище состояний FSM: в памяти процесса или в Redis (общее для нескольких процессов бота)
+def create_fsm_storage() -> BaseStorage:
+    if FSM_STORAGE == "redis":
+        return RedisStorage.from_url(
+            REDIS_URL,
+            state_ttl=FSM_STATE_TTL or None,
+            data_ttl=FSM_DATA_TTL or None,
+        )
+    return MemoryStorage()
+
+
 bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
+dp = Dispatcher(storage=create_fsm_storage())
+
+# Проверка числа SQL-запросов апдейта и N+1 (QUERY_BUDGET=warn|raise)
+if QUERY_BUDGET != "off":
+    watch_engine(engine)
+    dp.update.middleware(QueryBudgetMiddleware(QUERY_BUDGET_LIMIT, QUERY_REPEAT_LIMIT, fail=QUERY_BUDGET == "raise"))
+
+# Одна сессия БД на апдейт (аргумент session в обработчиках)
+dp.update.middleware(DbSessionMiddleware(async_session_maker))
 
-# Подключаем роутеры
+# Метрики Prometheus: время обработчиков, SQL-запросы апдейта, запросы к Bot API
+instrument_engine(engine)
+dp.message.middleware(HandlerMetricsMiddleware())
+dp.callback_query.middleware(HandlerMetricsMiddleware())
+bot.session.middleware(BotApiMetricsMiddleware())
+
+# Профили cProfile для выборки медленных апдейтов (PROFILING=1 или /profiling on)
+dp.message.middleware(ProfilingMiddleware(update_profiler))
+dp.callback_query.middleware(ProfilingMiddleware(update_profiler))
+
+# Подключаем роутеры (служебные команды — раньше состояний FSM, которые принимают любой текст)
+dp.include_router(admin_router)
 dp.include_router(start_router)
 dp.include_router(habits_router)
 dp.include_router(settings_router)
+# Последним: нажатия старых кнопок, которые не разобрал ни один роутер
+dp.include_router(fallback_router)
+
+# Пул отрисовки графиков и соединения с Redis и БД живут вместе с ботом
+@dp.startup()
+async def on_startup():
+    identity_cache.start_listener()
+    update_profiler.start_listener()
+    # Без прогрева numpy и процессы графиков загрузятся при первом графике
+    if CHART_WARMUP:
+        chart_renderer.start()
+        warm_up_in_background()
+
+@dp.shutdown()
+async def on_shutdown():
+    chart_renderer.shutdown()
+    await identity_cache.stop_listener()
+    await update_profiler.stop_listener()
+    await close_redis()
+    await engine.dispose()
+
 
-async def main():
+# РЕЖИМ WEBHOOK
+async def set_webhook(bot: Bot):
+    await bot.set_webhook(
+        f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+
+async def delete_webhook(bot: Bot):
+    await bot.delete_webhook()
+
+# Веб-приложение aiohttp: Telegram присылает апдейты POST-запросами на WEBHOOK_PATH
+def create_webhook_app() -> web.Application:
+    if not WEBHOOK_BASE_URL or not WEBHOOK_SECRET:
+        raise RuntimeError("Для BOT_MODE=webhook нужны WEBHOOK_BASE_URL и WEBHOOK_SECRET")
+
+    dp.startup.register(set_webhook)
+    if WEBHOOK_DELETE_ON_SHUTDOWN:
+        dp.shutdown.register(delete_webhook)
+
+    app = web.Application()
+    # Запросы без верного секрета в заголовке отклоняются (401)
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    # Хуки startup/shutdown диспетчера срабатывают вместе с запуском/остановкой приложения
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+# РЕЖИМ POLLING (для разработки)
+async def run_polling():
+    # getUpdates не работает, пока установлен webhook
+    await bot.delete_webhook()
     await dp.start_polling(bot)
 
+
+def main():
+    start_metrics_server(METRICS_PORT)
+
+    if UPDATE_FANOUT:
+        # Только приём: апдейты уходят в Redis Streams, обрабатывает python -m bot.worker
+        from bot.ingest import create_ingest_app, run_ingest_polling
+        allowed_updates = dp.resolve_used_update_types()
+        if BOT_MODE == "webhook":
+            web.run_app(create_ingest_app(bot, allowed_updates), host=WEBAPP_HOST, port=WEBAPP_PORT)
+        else:
+            asyncio.run(run_ingest_polling(bot, allowed_updates))
+        return
+
+    if BOT_MODE == "webhook":
+        web.run_app(create_webhook_app(), host=WEBAPP_HOST, port=WEBAPP_PORT)
+    else:
+        asyncio.run(run_polling())
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    main()
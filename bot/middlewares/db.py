@@ -0,0 +1,35 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Одна сессия БД на апдейт: передаётся в обработчик аргументом session.
+
+    Соединение берётся из пула только при первом запросе, поэтому апдейты
+    без работы с БД пул не трогают. В конце апдейта транзакция фиксируется,
+    при исключении — откатывается. Обработчик может вызвать session.commit()
+    раньше, чтобы вернуть соединение в пул перед долгими запросами к Bot API.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker):
+        self.session_maker = session_maker
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with self.session_maker() as session:
+            data["session"] = session
+            try:
+                result = await handler(event, data)
+            except Exception:
+                await session.rollback()
+                raise
+            await session.commit()
+            return result
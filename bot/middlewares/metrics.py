@@ -0,0 +1,67 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+
+from bot.services.metrics import (
+    BOT_API_DURATION, BOT_API_ERRORS, DB_QUERIES_PER_UPDATE, DB_TIME_PER_UPDATE, HANDLER_DURATION,
+    HANDLER_ERRORS, update_queries,
+)
+
+
+# Метки апдейта: роутер, функция-обработчик и код действия кнопки ("-" — не кнопка)
+def handler_labels(data: Dict[str, Any]) -> tuple[str, str, str]:
+    callback_data = data.get("callback_data")
+    action = getattr(callback_data, "action", None)
+    action = getattr(action, "value", action) or "-"
+    return data["event_router"].name, data["handler"].callback.__name__, action
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Время обработчика и SQL-запросы апдейта (внутренний middleware).
+
+    Метки: имя роутера, функция-обработчик и код действия кнопки — все кнопки
+    роутера приходят в один обработчик, различает их только действие.
+    SQL-запросы считает bot.services.metrics.instrument_engine.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        labels = handler_labels(data)
+        router, _, action = labels
+
+        counter = [0, 0.0]
+        token = update_queries.set(counter)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(*labels).inc()
+            raise
+        finally:
+            HANDLER_DURATION.labels(*labels).observe(time.perf_counter() - started)
+            DB_QUERIES_PER_UPDATE.labels(router, action).observe(counter[0])
+            DB_TIME_PER_UPDATE.labels(router, action).observe(counter[1])
+            update_queries.reset(token)
+
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    """Время и ошибки каждого запроса к Bot API (middleware сессии бота)"""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            BOT_API_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            BOT_API_DURATION.labels(name).observe(time.perf_counter() - started)
@@ -0,0 +1,52 @@
+import cProfile
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bot.middlewares.metrics import handler_labels
+from bot.services.profiling import UpdateProfiler
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """
+    Профиль cProfile для выборки апдейтов (внутренний middleware).
+
+    Файл профиля подписан теми же метками, что и метрики: роутер, обработчик
+    и действие кнопки. cProfile видит весь поток, поэтому пока обработчик ждёт
+    БД или Bot API, в профиль попадают и чужие задачи event loop — смотреть
+    стоит на cumtime функций самого обработчика.
+    """
+
+    def __init__(self, profiler: UpdateProfiler):
+        self.profiler = profiler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not self.profiler.sample():
+            return await handler(event, data)
+
+        profile = cProfile.Profile()
+        self.profiler.busy = True
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            return await handler(event, data)
+        finally:
+            profile.disable()
+            self.profiler.busy = False
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            update = data.get("event_update")
+            path = await self.profiler.save(
+                profile, getattr(update, "update_id", 0), handler_labels(data), elapsed_ms,
+            )
+            if path:
+                logger.info("Профиль апдейта (%.0f мс): %s", elapsed_ms, path)
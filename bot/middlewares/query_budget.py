@@ -0,0 +1,46 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bot.services.query_budget import QueryBudgetExceeded, QueryLog, current_query_log
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    """
+    Проверка SQL-запросов апдейта (для разработки и бенчмарков).
+
+    Записывает все запросы апдейта и, если их больше budget или один и тот же
+    запрос (с точностью до параметров) повторяется больше repeat_limit раз,
+    пишет предупреждение или — при fail=True — бросает QueryBudgetExceeded.
+    Регистрируется раньше DbSessionMiddleware, чтобы учесть и фиксацию транзакции.
+    """
+
+    def __init__(self, budget: int, repeat_limit: int, fail: bool = False):
+        self.budget = budget
+        self.repeat_limit = repeat_limit
+        self.fail = fail
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        query_log = QueryLog()
+        token = current_query_log.set(query_log)
+        try:
+            result = await handler(event, data)
+        finally:
+            current_query_log.reset(token)
+
+        problems = query_log.problems(self.budget, self.repeat_limit)
+        if problems:
+            message = f"Апдейт {event.update_id}: " + "; ".join(problems)
+            if self.fail:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return result
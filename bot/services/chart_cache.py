@@ -0,0 +1,110 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import date
+
+from redis.exceptions import RedisError
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from bot.database.models import Habit
+from bot.services.redis_client import get_redis
+from config import CHART_BACKEND, CHART_FORMAT, CHART_WIDTH, CHART_MAX_BYTES
+from config import CHART_CACHE_SIZE, CHART_CACHE_MAX_BYTES, CHART_CACHE_REDIS, CHART_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+# Ключ графика: меняется при любом изменении данных привычки и со сменой дня (UTC)
+def chart_cache_key(habit: Habit, days: int, today: date) -> str:
+    # Название, тип, единица, движок отрисовки и формат картинки видны на графике — берём их хэш, а не сами строки
+    appearance = (f"{habit.name}|{habit.habit_type}|{habit.numeric_unit or ''}"
+                  f"|{CHART_BACKEND}|{CHART_FORMAT}|{CHART_WIDTH}|{CHART_MAX_BYTES}")
+    digest = hashlib.sha1(appearance.encode()).hexdigest()[:12]
+    return f"chart:{habit.id}:{days}:{habit.data_version or 0}:{today.isoformat()}:{digest}"
+
+
+# Отмечает изменение данных привычки: старые графики больше не подходят
+async def mark_habit_changed(session, habit: Habit):
+    # Увеличение на стороне базы: параллельные апдейты одной привычки не теряют версию
+    version = (await session.execute(
+        update(Habit)
+        .where(Habit.id == habit.id)
+        .values(data_version=Habit.data_version + 1)
+        .returning(Habit.data_version)
+        .execution_options(synchronize_session=False)
+    )).scalar_one()
+    # Значение уже в базе: атрибут не помечается изменённым и читается без запроса
+    set_committed_value(habit, "data_version", version)
+    chart_cache.invalidate_habit(habit.id)
+
+
+class ChartCache:
+    """
+    LRU-кэш картинок графиков в памяти процесса с необязательным уровнем в Redis.
+
+    Устаревшие записи не нужно искать: версия данных входит в ключ,
+    invalidate_habit() лишь освобождает память локального уровня.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, use_redis: bool = False, redis_ttl: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.use_redis = use_redis
+        self.redis_ttl = redis_ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def _put_local(self, key: str, png: bytes):
+        if len(png) > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+
+        self._entries[key] = png
+        self._bytes += len(png)
+
+        # Вытесняем давно не использованные графики
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    async def get(self, key: str) -> bytes | None:
+        png = self._entries.get(key)
+        if png is not None:
+            self._entries.move_to_end(key)
+            return png
+
+        if not self.use_redis:
+            return None
+
+        try:
+            png = await get_redis().get(key)
+        except RedisError as e:
+            logger.warning("Кэш графиков в Redis недоступен: %s", e)
+            return None
+
+        if png is not None:
+            self._put_local(key, png)
+        return png
+
+    async def set(self, key: str, png: bytes):
+        self._put_local(key, png)
+
+        if not self.use_redis:
+            return
+
+        try:
+            await get_redis().set(key, png, ex=self.redis_ttl)
+        except RedisError as e:
+            logger.warning("Кэш графиков в Redis недоступен: %s", e)
+
+    def invalidate_habit(self, habit_id: int):
+        prefix = f"chart:{habit_id}:"
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            self._bytes -= len(self._entries.pop(key))
+
+
+chart_cache = ChartCache(CHART_CACHE_SIZE, CHART_CACHE_MAX_BYTES, CHART_CACHE_REDIS, CHART_CACHE_TTL)
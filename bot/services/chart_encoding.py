@@ -0,0 +1,74 @@
+import io
+
+from config import CHART_FORMAT, CHART_WIDTH, CHART_MAX_BYTES
+
+# Ступени сжатия по форматам: качество (jpeg, webp) или число цветов палитры (png8)
+QUALITY_STEPS = {
+    "png": (None,),
+    "png8": (256, 64, 16),
+    "webp": (85, 70, 55),
+    "jpeg": (85, 70, 55),
+}
+# Во сколько раз уменьшать ширину, если не уложились в CHART_MAX_BYTES, и предел уменьшения
+SCALE_STEP = 0.8
+MIN_WIDTH = 640
+
+EXTENSIONS = {"png": "png", "png8": "png", "webp": "webp", "jpeg": "jpg"}
+
+
+# Имя файла графика для отправки в Telegram
+def chart_filename(name: str = "chart") -> str:
+    return f"{name}.{EXTENSIONS.get(CHART_FORMAT, 'png')}"
+
+
+def _encode(image, image_format: str, quality) -> bytes:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    if image_format == "png8":
+        # Графики почти одноцветные — палитры хватает, размер в разы меньше.
+        # optimize=True сжимает ещё на треть, но втрое дольше — не нужен при таком размере
+        image = image.quantize(quality, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+        image.save(buf, format="PNG")
+    elif image_format == "webp":
+        image.save(buf, format="WEBP", quality=quality, method=4)
+    elif image_format == "jpeg":
+        # Без прореживания цвета: иначе цветные края текста и столбцов размываются
+        image.save(buf, format="JPEG", quality=quality, optimize=True, subsampling=0)
+    else:
+        image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+# Кодирует готовый растр графика (выполняется в процессе-воркере)
+def encode_chart(image, image_format: str = CHART_FORMAT, width: int = CHART_WIDTH,
+                 max_bytes: int = CHART_MAX_BYTES) -> bytes:
+    """
+    Уменьшает картинку до width по ширине и кодирует в image_format. Если
+    результат больше max_bytes, сначала снижает качество (или число цветов),
+    затем с самым низким качеством уменьшает ширину до MIN_WIDTH — попыток
+    не больше шести, так что время кодирования ограничено. Если бюджет
+    недостижим, возвращает самый маленький вариант.
+    """
+    from PIL import Image
+
+    image = image.convert("RGB")
+    steps = QUALITY_STEPS.get(image_format, QUALITY_STEPS["png"])
+    target = min(width or image.width, image.width)
+    best = None
+    while True:
+        if target < image.width:
+            height = round(image.height * target / image.width)
+            resized = image.resize((target, height), Image.Resampling.LANCZOS)
+        else:
+            resized = image
+        for quality in steps:
+            data = _encode(resized, image_format, quality)
+            if best is None or len(data) < len(best):
+                best = data
+            if not max_bytes or len(data) <= max_bytes:
+                return data
+        if target <= MIN_WIDTH:
+            return best
+        target = max(MIN_WIDTH, int(target * SCALE_STEP))
+        steps = steps[-1:]
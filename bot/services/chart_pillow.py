@@ -0,0 +1,247 @@
+import importlib.util
+import os
+from functools import lru_cache
+
+from bot.services.chart_encoding import encode_chart
+from bot.services.charts import (
+    COLOR_DONE, COLOR_MISSED, HEATMAP_BOOLEAN_LEVEL, HEATMAP_CELL, HEATMAP_COLORS, HEATMAP_GAP, ChartData,
+    chart_layout, heatmap_layout,
+)
+from config import CHART_FONT
+
+# Размер и поля холста — как у графика matplotlib (12x8 дюймов, 100 dpi)
+WIDTH, HEIGHT = 1200, 800
+LEFT, RIGHT, TOP, BOTTOM = 95, 30, 85, 105
+PANEL_GAP = 60
+HEATMAP_HEIGHT, HEATMAP_TOP = 300, 100
+
+COLOR_LINE = '#339af0'
+COLOR_FILL = '#d6ebfc'  # COLOR_LINE с прозрачностью 0.2 на белом
+COLOR_GRID = '#e6e6e6'
+COLOR_TEXT = '#000000'
+
+
+# Шрифт с кириллицей: CHART_FONT или DejaVu Sans из пакета matplotlib (сам matplotlib не импортируется)
+def _font_path() -> str | None:
+    if CHART_FONT:
+        return CHART_FONT
+    spec = importlib.util.find_spec("matplotlib")
+    if spec and spec.submodule_search_locations:
+        path = os.path.join(spec.submodule_search_locations[0], "mpl-data", "fonts", "ttf", "DejaVuSans.ttf")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@lru_cache(maxsize=None)
+def _font(size: int):
+    from PIL import ImageFont
+
+    path = _font_path()
+    if path:
+        return ImageFont.truetype(path, size)
+    return ImageFont.load_default(size)
+
+
+# Загружает Pillow и шрифты в воркере заранее
+def load_fonts():
+    for size in (12, 13, 14, 17, 22):
+        _font(size)
+
+
+# Линейное отображение значений данных в пиксели (массивы NumPy)
+def _scale(values, lo: float, hi: float, px_lo: float, px_hi: float):
+    return px_lo + (values - lo) * (px_hi - px_lo) / (hi - lo)
+
+
+# «Круглые» деления оси от 0 до не меньше vmax
+def _nice_ticks(vmax: float, count: int = 5):
+    import numpy as np
+
+    vmax = max(float(vmax), 1.0)
+    raw = vmax / count
+    magnitude = 10 ** np.floor(np.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw)
+    if step >= 1:
+        step = float(np.ceil(step))
+    return np.arange(0, vmax + step, step)
+
+
+def _rotated_text(image, xy, text: str, font, angle: float, anchor: str = "center"):
+    from PIL import Image, ImageDraw
+
+    left, top, right, bottom = font.getbbox(text)
+    label = Image.new("L", (right - left + 2, bottom - top + 2), 0)
+    ImageDraw.Draw(label).text((1 - left, 1 - top), text, font=font, fill=255)
+    label = label.rotate(angle, expand=True, resample=Image.BICUBIC)
+    x, y = xy
+    if anchor == "top-right":
+        position = (int(x - label.width), int(y))
+    else:
+        position = (int(x - label.width / 2), int(y - label.height / 2))
+    image.paste(COLOR_TEXT, position, label)
+
+
+def _y_axis(draw, image, box, ticks, labels, ylim, title: str):
+    x0, y0, x1, y1 = box
+    for tick, label in zip(_scale(ticks, *ylim, y1, y0), labels):
+        draw.line([(x0 - 4, tick), (x0, tick)], fill=COLOR_TEXT)
+        draw.text((x0 - 7, tick), label, font=_font(13), fill=COLOR_TEXT, anchor="rm")
+    _rotated_text(image, (x0 - 70, (y0 + y1) / 2), title, _font(14), 90)
+
+
+def _grid(draw, box, ticks, ylim):
+    x0, y0, x1, y1 = box
+    for tick in _scale(ticks, *ylim, y1, y0):
+        draw.line([(x0, tick), (x1, tick)], fill=COLOR_GRID)
+
+
+def _bars(draw, box, heights, colors, ylim, edge: bool):
+    import numpy as np
+
+    x0, y0, x1, y1 = box
+    days = len(heights)
+    pad = max(0.6, days * 0.02)
+    centers = _scale(np.arange(days), -pad, days - 1 + pad, x0, x1)
+    half = 0.4 * (x1 - x0) / (days - 1 + 2 * pad)
+    tops = _scale(np.asarray(heights, dtype=float), *ylim, y1, y0)
+    bottom = _scale(0.0, *ylim, y1, y0)
+    for left, right, top, color in zip(centers - half, centers + half, tops, colors):
+        if top < bottom:
+            draw.rectangle([left, top, right, bottom], fill=color, outline='white' if edge else None)
+    return centers, tops
+
+
+# Рисует тот же график, что и render_habit_chart, примитивами Pillow (выполняется в отдельном процессе)
+def render_habit_chart_pillow(data: ChartData) -> bytes:
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    if data.view == "heatmap":
+        return render_heatmap_pillow(data)
+
+    layout = chart_layout(data)
+    values = data.values
+    days = layout.days
+    colors = np.where(layout.done, COLOR_DONE, COLOR_MISSED)
+
+    image = Image.new("RGB", (WIDTH, HEIGHT), "white")
+    draw = ImageDraw.Draw(image)
+    draw.text((WIDTH / 2, 12), layout.title, font=_font(22), fill=COLOR_TEXT, anchor="ma")
+
+    # Высоты панелей 1:3 (числовые) или 1:2 (булевы)
+    ratio = (1, 3) if layout.is_numeric else (1, 2)
+    panels_height = HEIGHT - TOP - BOTTOM - PANEL_GAP
+    top_height = panels_height * ratio[0] / sum(ratio)
+    top_box = (LEFT, TOP, WIDTH - RIGHT, TOP + top_height)
+    bottom_box = (LEFT, TOP + top_height + PANEL_GAP, WIDTH - RIGHT, HEIGHT - BOTTOM)
+
+    # ВЕРХНИЙ ГРАФИК
+    x0, y0, x1, y1 = top_box
+    draw.text(((x0 + x1) / 2, y0 - 6), layout.top_title, font=_font(17), fill=COLOR_TEXT, anchor="md")
+    if layout.is_numeric:
+        cumulative = layout.cumulative
+        ticks = _nice_ticks(cumulative.max() * 1.05 if days else 1, count=3)
+        ylim = (0, ticks[-1])
+        _grid(draw, top_box, ticks, ylim)
+        pad = max(0.6, days * 0.02)
+        xs = _scale(np.arange(days), -pad, days - 1 + pad, x0, x1)
+        ys = _scale(cumulative.astype(float), *ylim, y1, y0)
+        points = list(zip(xs.tolist(), ys.tolist()))
+        draw.polygon([(xs[0], y1)] + points + [(xs[-1], y1)], fill=COLOR_FILL)
+        draw.line(points, fill=COLOR_LINE, width=3, joint="curve")
+        if layout.label_step == 1:
+            for x, y in points:
+                draw.ellipse([x - 4, y - 4, x + 4, y + 4], fill=COLOR_LINE)
+        _y_axis(draw, image, top_box, ticks, [f"{t:g}" for t in ticks], ylim, 'Накоплено')
+    else:
+        ticks = np.arange(0, 101, 20)
+        ylim = (0, 100)
+        centers = _scale(np.array([0, 1]), -0.6, 1.6, x0, x1)
+        half = 0.4 * (x1 - x0) / 2.2
+        done_top = _scale(layout.percentage, *ylim, y1, y0)
+        draw.rectangle([centers[0] - half, done_top, centers[0] + half, y1], fill=COLOR_DONE)
+        draw.rectangle([centers[1] - half, y0, centers[1] + half, done_top], fill=COLOR_MISSED)
+        for center, label in zip(centers, ('Выполнено', 'Пропущено')):
+            draw.text((center, y1 + 6), label, font=_font(13), fill=COLOR_TEXT, anchor="ma")
+        _y_axis(draw, image, top_box, ticks, [f"{t:g}" for t in ticks], ylim, 'Процент (%)')
+    draw.rectangle(top_box, outline=COLOR_TEXT)
+
+    # НИЖНИЙ ГРАФИК (разный для типов привычек)
+    x0, y0, x1, y1 = bottom_box
+    edge = layout.label_step == 1
+    if layout.is_numeric:
+        # ЧИСЛОВАЯ
+        ticks = _nice_ticks(values.max() * 1.05 if days else 1)
+        ylim = (0, ticks[-1])
+        tick_labels = [f"{t:g}" for t in ticks]
+        _grid(draw, bottom_box, ticks, ylim)
+        centers, tops = _bars(draw, bottom_box, values, colors, ylim, edge)
+        if layout.label_step == 1:
+            for center, top, value in zip(centers, tops, values):
+                if value > 0:
+                    draw.text((center, top - 2), str(value), font=_font(12), fill=COLOR_TEXT, anchor="md")
+        # Легенда в левом верхнем углу
+        for row, (color, label) in enumerate(((COLOR_DONE, 'Выполнено'), (COLOR_MISSED, 'Пропущено'))):
+            y = y0 + 14 + row * 22
+            draw.rectangle([x0 + 12, y - 6, x0 + 36, y + 6], fill=color)
+            draw.text((x0 + 44, y), label, font=_font(13), fill=COLOR_TEXT, anchor="lm")
+    else:
+        # БУЛЕВАЯ
+        ticks = np.array([0, 1])
+        ylim = (0, 1.2)
+        tick_labels = ['Нет', 'Да']
+        _grid(draw, bottom_box, ticks, ylim)
+        centers, _ = _bars(draw, bottom_box, np.ones(days), colors, ylim, edge)
+    _y_axis(draw, image, bottom_box, ticks, tick_labels, ylim, layout.value_label)
+    draw.rectangle(bottom_box, outline=COLOR_TEXT)
+
+    # Подписи дней под углом 45°, как у matplotlib
+    for tick, label in zip(layout.ticks, layout.tick_labels):
+        x = centers[tick]
+        draw.line([(x, y1), (x, y1 + 4)], fill=COLOR_TEXT)
+        _rotated_text(image, (x + 8, y1 + 6), label, _font(12), 45, anchor="top-right")
+    draw.text(((x0 + x1) / 2, HEIGHT - 20), 'Дни', font=_font(14), fill=COLOR_TEXT, anchor="md")
+
+    return encode_chart(image)
+
+
+# Рисует календарь за год: растр сетки вставляется целиком, поверх — подписи
+def render_heatmap_pillow(data: ChartData) -> bytes:
+    from PIL import Image, ImageDraw
+
+    layout = heatmap_layout(data)
+    pitch = HEATMAP_CELL + HEATMAP_GAP
+    grid = Image.fromarray(layout.pixels, "RGB")
+    left = max(50, (WIDTH - grid.width) // 2 + 15)
+
+    image = Image.new("RGB", (WIDTH, HEATMAP_HEIGHT), "white")
+    draw = ImageDraw.Draw(image)
+    draw.text((WIDTH / 2, 12), layout.title, font=_font(22), fill=COLOR_TEXT, anchor="ma")
+    draw.text((WIDTH / 2, 46), layout.subtitle, font=_font(17), fill=COLOR_TEXT, anchor="ma")
+    image.paste(grid, (left, HEATMAP_TOP))
+
+    for week, month in layout.months:
+        draw.text((left + week * pitch, HEATMAP_TOP - 6), month, font=_font(13), fill=COLOR_TEXT, anchor="ld")
+    for row, weekday in ((0, 'Пн'), (2, 'Ср'), (4, 'Пт')):
+        y = HEATMAP_TOP + row * pitch + HEATMAP_CELL / 2
+        draw.text((left - 8, y), weekday, font=_font(13), fill=COLOR_TEXT, anchor="rm")
+
+    # Легенда под сеткой справа
+    if layout.is_numeric:
+        legend = [(None, 'Меньше')] + [(color, '') for color in HEATMAP_COLORS] + [(None, 'Больше')]
+    else:
+        legend = [(HEATMAP_COLORS[0], 'Пропущено'), (HEATMAP_COLORS[HEATMAP_BOOLEAN_LEVEL], 'Выполнено')]
+    y = HEATMAP_TOP + grid.height + 14
+    x = left + grid.width - HEATMAP_GAP
+    for color, label in reversed(legend):
+        if label:
+            x -= _font(13).getlength(label)
+            draw.text((x, y + HEATMAP_CELL / 2), label, font=_font(13), fill=COLOR_TEXT, anchor="lm")
+            x -= 6
+        if color:
+            x -= HEATMAP_CELL
+            draw.rectangle([x, y, x + HEATMAP_CELL - 1, y + HEATMAP_CELL - 1], fill=color)
+            x -= HEATMAP_GAP + (6 if label else 0)
+
+    return encode_chart(image)
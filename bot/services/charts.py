@@ -0,0 +1,409 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import TYPE_CHECKING
+
+from bot.services.chart_encoding import encode_chart
+from config import CHART_WORKERS, CHART_MAX_PENDING, CHART_WORKER_MAX_TASKS, CHART_BACKEND
+
+logger = logging.getLogger(__name__)
+
+
+class ChartQueueFull(Exception):
+    """Слишком много графиков ждут отрисовки"""
+
+
+class ChartWorkerCrashed(Exception):
+    """Процесс отрисовки упал (например, убит по нехватке памяти); пул пересоздан"""
+
+
+COLOR_DONE = '#51cf66'
+COLOR_MISSED = '#ff6b6b'
+
+# Годовой календарь (как у GitHub): период, цвета «нет отметки» и 4 уровней, размер клетки
+HEATMAP_DAYS = 365
+HEATMAP_COLORS = ('#ebedf0', '#c6e48b', '#7bc96f', '#239a3b', '#196127')
+HEATMAP_BOOLEAN_LEVEL = 3
+HEATMAP_CELL, HEATMAP_GAP = 18, 3
+# Подпись месяца шире двух недель-столбцов: ближе подписи сливаются
+HEATMAP_LABEL_WEEKS = 2
+MONTHS = ('янв', 'фев', 'мар', 'апр', 'май', 'июн', 'июл', 'авг', 'сен', 'окт', 'ноя', 'дек')
+
+# numpy и matplotlib импортируются при первом графике (или в bot.services.warmup)
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# Данные для отрисовки: только простые типы, чтобы передавать их в процесс-воркер
+@dataclass
+class ChartData:
+    habit_name: str
+    habit_type: str
+    numeric_unit: str | None
+    start_date: date
+    values: "np.ndarray"  # одно значение на день периода, 0 — нет отметки
+    view: str = "bars"  # bars — столбцы по дням, heatmap — календарь за год
+
+
+# Раскладывает отметки по дням периода (за один проход по отметкам)
+def prepare_chart_values(rows, start_date: date, days: int, habit_type: str) -> "np.ndarray":
+    """
+    :param rows: пары (дата, значение), отсортированные по дате
+    :return: массив длины days; для числовых привычек — количество, для булевых — 1
+    """
+    import numpy as np
+
+    values = np.zeros(days, dtype=np.int64)
+    if not rows:
+        return values
+
+    log_dates = np.array([row[0] for row in rows], dtype='datetime64[D]')
+    offsets = (log_dates - np.datetime64(start_date, 'D')).astype(np.int64)
+
+    if habit_type == "numeric":
+        # отметка без значения (старые данные) считается за 1
+        amounts = np.array([row[1] or 1 for row in rows], dtype=np.int64)
+    else:
+        amounts = np.ones(len(rows), dtype=np.int64)
+
+    # Отбрасываем даты вне периода; из нескольких отметок одного дня берём первую
+    in_period = (offsets >= 0) & (offsets < days)
+    offsets, first = np.unique(offsets[in_period], return_index=True)
+    values[offsets] = amounts[in_period][first]
+    return values
+
+
+# Общие для всех движков отрисовки величины графика
+@dataclass
+class ChartLayout:
+    title: str
+    top_title: str
+    is_numeric: bool
+    days: int
+    done: "np.ndarray"  # дни с отметкой
+    completed: int
+    percentage: float
+    cumulative: "np.ndarray | None"  # накопленная сумма (только числовые)
+    label_step: int  # подписываем каждый label_step-й день
+    ticks: "np.ndarray"
+    tick_labels: list[str]
+    value_label: str  # подпись оси значений нижнего графика
+
+
+def chart_layout(data: ChartData) -> ChartLayout:
+    import numpy as np
+
+    values = data.values
+    days = len(values)
+    is_numeric = data.habit_type == "numeric"
+    completed = int(np.count_nonzero(values))
+    percentage = (completed / days) * 100 if days > 0 else 0
+    # На длинных периодах подписываем не каждый день
+    label_step = max(1, -(-days // 31))
+    ticks = np.arange(days)[::label_step]
+
+    if is_numeric:
+        top_title = f'Прогресс за {days} дней'
+        value_label = f'Количество ({data.numeric_unit or "ед."})'
+    else:
+        top_title = f'Выполнено: {completed}/{days} дней ({percentage:.1f}%)'
+        value_label = 'Факт'
+
+    return ChartLayout(
+        title=f'Статистика: {data.habit_name}',
+        top_title=top_title,
+        is_numeric=is_numeric,
+        days=days,
+        done=values > 0,
+        completed=completed,
+        percentage=percentage,
+        cumulative=np.cumsum(values) if is_numeric else None,
+        label_step=label_step,
+        ticks=ticks,
+        tick_labels=[(data.start_date + timedelta(days=int(i))).strftime('%d.%m') for i in ticks],
+        value_label=value_label,
+    )
+
+
+# Календарь за год: сетка «день недели × неделя», общая для всех движков
+@dataclass
+class HeatmapLayout:
+    title: str
+    subtitle: str
+    is_numeric: bool
+    levels: "np.ndarray"  # (7, недель): -1 — вне периода, 0 — нет отметки, 1..4 — интенсивность
+    months: list[tuple[int, str]]  # (неделя, месяц) — где начинается месяц
+    pixels: "np.ndarray"  # RGB-растр сетки с промежутками между клетками
+
+
+def heatmap_layout(data: ChartData) -> HeatmapLayout:
+    """
+    Размер сетки не зависит от истории привычки (53–54 недели), поэтому
+    и время отрисовки фиксировано. Числовые значения раскладываются по
+    4 уровням по квартилям ненулевых значений периода.
+    """
+    import numpy as np
+
+    values = data.values
+    days = len(values)
+    is_numeric = data.habit_type == "numeric"
+    done = values > 0
+    completed = int(np.count_nonzero(done))
+
+    levels = np.zeros(days, dtype=np.int64)
+    if is_numeric and completed:
+        bounds = np.quantile(values[done], [0.25, 0.5, 0.75])
+        levels[done] = np.digitize(values[done], bounds, right=True) + 1
+    else:
+        levels[done] = HEATMAP_BOOLEAN_LEVEL
+
+    # Неделя начинается с понедельника: дополняем период до целых недель
+    offset = data.start_date.weekday()
+    weeks = -(-(offset + days) // 7)
+    padded = np.full(weeks * 7, -1, dtype=np.int64)
+    padded[offset:offset + days] = levels
+    grid = padded.reshape(weeks, 7).T
+
+    # Подписи месяцев — над неделями, с которых начинается новый месяц. Месяц недели —
+    # по её первому дню в периоде: понедельник первой неполной недели может быть раньше начала
+    mondays = np.datetime64(data.start_date - timedelta(days=offset), 'D') + np.arange(weeks) * 7
+    first_days = np.maximum(mondays, np.datetime64(data.start_date, 'D'))
+    month_index = first_days.astype('datetime64[M]').astype(np.int64) % 12
+    starts = np.flatnonzero(np.diff(month_index, prepend=-1))
+    # Подпись, за которой через 1–2 недели идёт следующая, слилась бы с ней
+    starts = [week for week, following in zip(starts, [*starts[1:], weeks + HEATMAP_LABEL_WEEKS])
+              if following - week > HEATMAP_LABEL_WEEKS]
+    months = [(int(week), MONTHS[month_index[week]]) for week in starts]
+
+    # Растр: каждая клетка — квадрат HEATMAP_CELL, между клетками белые промежутки
+    palette = np.array([(255, 255, 255)] + [tuple(int(c[i:i + 2], 16) for i in (1, 3, 5)) for c in HEATMAP_COLORS],
+                       dtype=np.uint8)
+    pitch = HEATMAP_CELL + HEATMAP_GAP
+    pixels = np.repeat(np.repeat(palette[grid + 1], pitch, axis=0), pitch, axis=1)
+    pixels[np.arange(pixels.shape[0]) % pitch >= HEATMAP_CELL] = 255
+    pixels[:, np.arange(pixels.shape[1]) % pitch >= HEATMAP_CELL] = 255
+
+    if is_numeric:
+        subtitle = (f'Всего: {int(values.sum())} {data.numeric_unit or "ед."} за {days} дней, '
+                    f'дней с отметкой: {completed}')
+    else:
+        percentage = (completed / days) * 100 if days > 0 else 0
+        subtitle = f'Выполнено: {completed}/{days} дней ({percentage:.1f}%)'
+
+    return HeatmapLayout(
+        title=f'Календарь: {data.habit_name}',
+        subtitle=subtitle,
+        is_numeric=is_numeric,
+        levels=grid,
+        months=months,
+        pixels=pixels,
+    )
+
+
+# Загружает движок отрисовки в воркере заранее, чтобы первый график не ждал импорта
+def _init_worker(backend: str = "matplotlib"):
+    if backend == "pillow":
+        from bot.services.chart_pillow import load_fonts
+        load_fonts()
+        return
+    import matplotlib
+    matplotlib.use("Agg")  # без дисплея
+    import matplotlib.pyplot  # noqa: F401
+
+
+# Растр фигуры matplotlib (1200x800 при 12x8 дюймах и 100 dpi) для стадии кодирования
+def _figure_image(fig):
+    from PIL import Image
+
+    fig.canvas.draw()
+    return Image.frombuffer("RGBA", fig.canvas.get_width_height(), fig.canvas.buffer_rgba(), "raw", "RGBA", 0, 1)
+
+
+# Рисует график выполнения привычки (выполняется в отдельном процессе)
+def render_habit_chart(data: ChartData) -> bytes:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+    from matplotlib.patches import Patch
+
+    if data.view == "heatmap":
+        return render_heatmap(data)
+
+    layout = chart_layout(data)
+    values = data.values
+    days = layout.days
+    x = np.arange(days)
+    colors = np.where(layout.done, COLOR_DONE, COLOR_MISSED)
+    # На длинных периодах не рисуем рамки столбцов
+    edge_width = 1 if layout.label_step == 1 else 0
+
+    # ПОСТРОЕНИЕ ГРАФИКА
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8),
+                                    height_ratios=[1, 3] if layout.is_numeric else [1, 2])
+    fig.suptitle(layout.title, fontsize=16)
+
+    # ВЕРХНИЙ ГРАФИК
+    if layout.is_numeric:
+        cumulative = layout.cumulative
+        ax1.plot(x, cumulative, color='#339af0', linewidth=2, marker='o' if layout.label_step == 1 else None)
+        ax1.fill_between(x, cumulative, alpha=0.2, color='#339af0')
+        ax1.set_ylabel('Накоплено', fontsize=10)
+        ax1.grid(True, alpha=0.3)
+    else:
+        percentage = layout.percentage
+        ax1.bar(['Выполнено'], [percentage], color=COLOR_DONE)
+        ax1.bar(['Пропущено'], [100 - percentage], bottom=[percentage], color=COLOR_MISSED)
+        ax1.set_ylim(0, 100)
+        ax1.set_ylabel('Процент (%)', fontsize=10)
+    ax1.set_title(layout.top_title, fontsize=12)
+
+    # НИЖНИЙ ГРАФИК (разный для типов привычек)
+    if layout.is_numeric:
+        # ЧИСЛОВАЯ
+        bars = ax2.bar(x, values, color=colors, edgecolor='white', linewidth=edge_width)
+        if layout.label_step == 1:
+            for bar, val in zip(bars, values):
+                if val > 0:
+                    ax2.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1,
+                            str(val), ha='center', va='bottom', fontsize=9)
+        legend_elements = [Patch(facecolor=COLOR_DONE, label='Выполнено'),
+                         Patch(facecolor=COLOR_MISSED, label='Пропущено')]
+        ax2.legend(handles=legend_elements, loc='upper left')
+    else:
+        # БУЛЕВАЯ
+        ax2.bar(x, np.ones(days), color=colors, edgecolor='white', linewidth=edge_width)
+        ax2.set_ylim(0, 1.2)
+        ax2.set_yticks([0, 1])
+        ax2.set_yticklabels(['Нет', 'Да'])
+    ax2.set_xlabel('Дни', fontsize=10)
+    ax2.set_ylabel(layout.value_label, fontsize=10)
+
+    # Общие настройки для нижнего графика
+    ax2.set_xticks(layout.ticks)
+    ax2.set_xticklabels(layout.tick_labels, rotation=45, fontsize=9)
+    ax2.grid(True, alpha=0.3, axis='y')
+
+    fig.tight_layout()
+    image = _figure_image(fig)
+    plt.close(fig)
+    return encode_chart(image)
+
+
+# Рисует календарь за год (matplotlib): готовый растр сетки + подписи
+def render_heatmap(data: ChartData) -> bytes:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
+
+    layout = heatmap_layout(data)
+    pitch = HEATMAP_CELL + HEATMAP_GAP
+
+    fig, ax = plt.subplots(figsize=(12, 3.4))
+    fig.suptitle(layout.title, fontsize=16)
+    ax.set_title(layout.subtitle, fontsize=12)
+    ax.imshow(layout.pixels, interpolation='nearest')
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    ax.tick_params(length=0)
+    ax.set_xticks([week * pitch + HEATMAP_CELL / 2 for week, _ in layout.months])
+    ax.set_xticklabels([month for _, month in layout.months], fontsize=9)
+    ax.xaxis.set_ticks_position('top')
+    ax.set_yticks([row * pitch + HEATMAP_CELL / 2 for row in (0, 2, 4)])
+    ax.set_yticklabels(['Пн', 'Ср', 'Пт'], fontsize=9)
+
+    if layout.is_numeric:
+        legend = [Patch(facecolor=color, label=label)
+                  for color, label in zip(HEATMAP_COLORS, ('нет', 'меньше', '', '', 'больше'))]
+    else:
+        legend = [Patch(facecolor=HEATMAP_COLORS[0], label='Пропущено'),
+                  Patch(facecolor=HEATMAP_COLORS[HEATMAP_BOOLEAN_LEVEL], label='Выполнено')]
+    ax.legend(handles=legend, loc='upper right', bbox_to_anchor=(1, -0.02), ncol=len(legend),
+              fontsize=9, frameon=False, handlelength=1, columnspacing=1)
+
+    fig.tight_layout()
+    image = _figure_image(fig)
+    plt.close(fig)
+    return encode_chart(image)
+
+
+# Функция отрисовки для движка из CHART_BACKEND
+def chart_render_function(backend: str):
+    if backend == "pillow":
+        from bot.services.chart_pillow import render_habit_chart_pillow
+        return render_habit_chart_pillow
+    return render_habit_chart
+
+
+class ChartRenderer:
+    """
+    Отрисовка графиков в пуле процессов, чтобы не блокировать event loop.
+
+    :param max_workers: сколько графиков рисуется одновременно
+    :param max_pending: сколько запросов может ждать (включая рисующиеся);
+                        сверх лимита render() сразу бросает ChartQueueFull
+    :param backend: движок отрисовки — matplotlib или pillow
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, max_tasks_per_child: int = None,
+                 backend: str = "matplotlib"):
+        self.backend = backend
+        self._render = chart_render_function(backend)
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self.max_tasks_per_child = max_tasks_per_child
+        self.pending = 0
+        self._executor = None
+        self._semaphore = asyncio.Semaphore(max_workers)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: воркеры не наследуют event loop и соединения бота
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.backend,),
+                max_tasks_per_child=self.max_tasks_per_child,
+            )
+        return self._executor
+
+    def start(self):
+        """Запускает процессы заранее, чтобы первый график не ждал их старта"""
+        executor = self._get_executor()
+        for _ in range(self.max_workers):
+            executor.submit(_init_worker, self.backend)
+
+    async def render(self, data: ChartData) -> bytes:
+        if self.pending >= self.max_pending:
+            raise ChartQueueFull()
+
+        self.pending += 1
+        try:
+            async with self._semaphore:
+                loop = asyncio.get_running_loop()
+                executor = self._get_executor()
+                try:
+                    return await loop.run_in_executor(executor, self._render, data)
+                except BrokenProcessPool as e:
+                    # Сломанный пул не принимает задачи — следующий график получит новый
+                    if self._executor is executor:
+                        logger.error("Процесс отрисовки графиков упал, пул пересоздаётся: %s", e)
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        self._executor = None
+                    raise ChartWorkerCrashed() from e
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+chart_renderer = ChartRenderer(CHART_WORKERS, CHART_MAX_PENDING, CHART_WORKER_MAX_TASKS or None, CHART_BACKEND)
@@ -0,0 +1,49 @@
+import logging
+
+from redis.exceptions import RedisError
+
+from bot.services.redis_client import get_redis
+from config import PHOTO_FILE_ID_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class PhotoFileIdStore:
+    """
+    Запоминает file_id, который Telegram вернул на загрузку картинки.
+    Повторная отправка той же картинки по file_id не требует загрузки байтов.
+
+    Ключ — ключ кэша графика (версия данных + дата), поэтому
+    изменившийся график никогда не получит старый file_id.
+    """
+
+    def __init__(self, ttl: int, prefix: str = "tg_file:"):
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> str | None:
+        if not self.ttl:
+            return None
+        try:
+            file_id = await get_redis().get(self.prefix + key)
+        except RedisError as e:
+            logger.warning("Хранилище file_id недоступно: %s", e)
+            return None
+        return file_id.decode() if file_id else None
+
+    async def set(self, key: str, file_id: str):
+        if not self.ttl:
+            return
+        try:
+            await get_redis().set(self.prefix + key, file_id, ex=self.ttl)
+        except RedisError as e:
+            logger.warning("Хранилище file_id недоступно: %s", e)
+
+    async def forget(self, key: str):
+        try:
+            await get_redis().delete(self.prefix + key)
+        except RedisError as e:
+            logger.warning("Хранилище file_id недоступно: %s", e)
+
+
+photo_file_ids = PhotoFileIdStore(PHOTO_FILE_ID_TTL)
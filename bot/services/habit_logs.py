@@ -0,0 +1,99 @@
+from datetime import date
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from bot.database.models import Habit, HabitLog, HabitNote, UserDailyStats
+
+
+# Отмечает привычку за день одним запросом
+async def insert_habit_log(session, habit: Habit, log_date: date, value: int = None) -> int | None:
+    """
+    INSERT … ON CONFLICT DO NOTHING по уникальному индексу (habit_id, date):
+    повторное нажатие не создаёт второй отметки и не требует SELECT заранее.
+
+    :return: id новой отметки или None, если день уже отмечен
+    """
+    stmt = (
+        insert(HabitLog)
+        .values(habit_id=habit.id, date=log_date, completed=True, value=value)
+        .on_conflict_do_nothing(index_elements=[HabitLog.habit_id, HabitLog.date])
+        .returning(HabitLog.id)
+    )
+    log_id = (await session.execute(stmt)).scalar()
+
+    if log_id is not None:
+        await update_daily_stats(session, habit.user_id, log_date, 1, value or 0)
+    return log_id
+
+
+# Снимает отметку привычки за день (вместе с пометками)
+async def delete_habit_log(session, habit: Habit, log_date: date) -> bool:
+    """:return: False, если отметки за этот день не было"""
+    row = (await session.execute(
+        select(HabitLog.id, HabitLog.value).where(
+            HabitLog.habit_id == habit.id,
+            HabitLog.date == log_date
+        )
+    )).first()
+    if row is None:
+        return False
+
+    await session.execute(delete(HabitNote).where(HabitNote.log_id == row.id))
+    await session.execute(delete(HabitLog).where(HabitLog.id == row.id))
+    await update_daily_stats(session, habit.user_id, log_date, -1, -(row.value or 0))
+    return True
+
+
+# Добавляет к дневной сводке пользователя (upsert одной строки)
+async def update_daily_stats(session, user_id: int, log_date: date, completions: int, numeric_total: int):
+    stmt = insert(UserDailyStats).values(
+        user_id=user_id,
+        date=log_date,
+        completions=completions,
+        numeric_total=numeric_total,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserDailyStats.user_id, UserDailyStats.date],
+        set_={
+            "completions": UserDailyStats.completions + stmt.excluded.completions,
+            "numeric_total": UserDailyStats.numeric_total + stmt.excluded.numeric_total,
+        },
+    )
+    await session.execute(stmt)
+
+
+# Вычитает из сводок все отметки привычки (перед её удалением)
+async def remove_habit_from_daily_stats(session, habit_id: int):
+    owner = select(Habit.user_id).where(Habit.id == habit_id).scalar_subquery()
+    per_day = (
+        select(
+            HabitLog.date,
+            func.count(HabitLog.id).label("completions"),
+            func.coalesce(func.sum(HabitLog.value), 0).label("numeric_total"),
+        )
+        .where(HabitLog.habit_id == habit_id)
+        .group_by(HabitLog.date)
+        .subquery()
+    )
+    await session.execute(
+        update(UserDailyStats)
+        .where(UserDailyStats.user_id == owner, UserDailyStats.date == per_day.c.date)
+        .values(
+            completions=UserDailyStats.completions - per_day.c.completions,
+            numeric_total=UserDailyStats.numeric_total - per_day.c.numeric_total,
+        )
+    )
+
+
+# Дневные сводки пользователя за период (одно сканирование по первичному ключу)
+async def load_daily_stats(session, user_id: int, start_date: date, end_date: date):
+    result = await session.execute(
+        select(UserDailyStats.date, UserDailyStats.completions, UserDailyStats.numeric_total)
+        .where(
+            UserDailyStats.user_id == user_id,
+            UserDailyStats.date >= start_date,
+            UserDailyStats.date <= end_date
+        )
+    )
+    return result.all()
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+from datetime import datetime
+
+from redis.exceptions import RedisError
+from sqlalchemy import select, update
+
+from bot.database.models import Habit, User
+from bot.services.redis_client import get_redis
+from config import IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL, IDENTITY_CACHE_PUBSUB
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "identity_cache:invalidate"
+
+
+# Неизменяемая копия строки users: её безопасно отдавать из кэша в любые обработчики
+@dataclass(frozen=True)
+class UserSnapshot:
+    telegram_id: int
+    username: str | None
+    full_name: str
+    registered_at: datetime
+    timezone: str
+    reminders_enabled: bool
+    reminder_time: str
+    reminder_minute_utc: int | None
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(**{f.name: getattr(user, f.name) for f in fields(cls)})
+
+
+class TTLCache:
+    """LRU-словарь с ограничением по числу записей и времени жизни"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class IdentityCache:
+    """
+    Кэш пользователей и владельцев привычек в памяти процесса.
+
+    Запись идёт через кэш (write-through): изменивший данные процесс сразу
+    обновляет свою копию, а остальным процессам бота рассылает в Redis pub/sub
+    сообщение, по которому они удаляют запись. Если сообщение потеряется,
+    запись всё равно устареет через ttl.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, use_pubsub: bool = True):
+        self.use_pubsub = use_pubsub
+        self._users = TTLCache(max_entries, ttl)
+        self._habit_owners = TTLCache(max_entries, ttl)
+        # свои сообщения об инвалидации слушатель пропускает
+        self._origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._listener = None
+
+    # ПОЛЬЗОВАТЕЛИ
+    async def get_user(self, session, telegram_id: int) -> UserSnapshot | None:
+        snapshot = self._users.get(telegram_id)
+        if snapshot is not None:
+            return snapshot
+
+        user = (await session.execute(
+            select(User).where(User.telegram_id == telegram_id)
+        )).scalar_one_or_none()
+        if user is None:
+            return None
+
+        snapshot = UserSnapshot.from_user(user)
+        self._users.set(telegram_id, snapshot)
+        return snapshot
+
+    def put_user(self, user: User):
+        self._users.set(user.telegram_id, UserSnapshot.from_user(user))
+
+    async def update_user(self, session, telegram_id: int, **values) -> UserSnapshot | None:
+        """Обновляет пользователя одним UPDATE, фиксирует транзакцию и затем — кэш"""
+        snapshot = await self.get_user(session, telegram_id)
+        if snapshot is None:
+            return None
+
+        await session.execute(
+            update(User).where(User.telegram_id == telegram_id).values(**values)
+        )
+        await session.commit()
+
+        snapshot = replace(snapshot, **values)
+        self._users.set(telegram_id, snapshot)
+        await self._publish("user", telegram_id)
+        return snapshot
+
+    # ВЛАДЕЛЬЦЫ ПРИВЫЧЕК
+    async def habit_owner(self, session, habit_id: int) -> int | None:
+        owner = self._habit_owners.get(habit_id)
+        if owner is not None:
+            return owner
+
+        owner = (await session.execute(
+            select(Habit.user_id).where(Habit.id == habit_id)
+        )).scalar()
+        if owner is not None:
+            self._habit_owners.set(habit_id, owner)
+        return owner
+
+    def put_habit(self, habit: Habit):
+        self._habit_owners.set(habit.id, habit.user_id)
+
+    async def habit_deleted(self, habit_id: int):
+        self._habit_owners.pop(habit_id)
+        await self._publish("habit", habit_id)
+
+    # ИНВАЛИДАЦИЯ МЕЖДУ ПРОЦЕССАМИ
+    async def _publish(self, kind: str, key: int):
+        if not self.use_pubsub:
+            return
+        try:
+            await get_redis().publish(INVALIDATION_CHANNEL, f"{self._origin}:{kind}:{key}")
+        except RedisError as e:
+            logger.warning("Не удалось разослать инвалидацию кэша: %s", e)
+
+    def _apply(self, message: str):
+        origin, kind, key = message.rsplit(":", 2)
+        if origin == self._origin:
+            return
+        if kind == "user":
+            self._users.pop(int(key))
+        elif kind == "habit":
+            self._habit_owners.pop(int(key))
+
+    async def _listen(self):
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Пока подписки не было, сообщения могли потеряться — начинаем с чистого кэша
+                self._users.clear()
+                self._habit_owners.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._apply(message["data"].decode())
+            except RedisError as e:
+                logger.warning("Подписка на инвалидацию кэша прервана: %s", e)
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.aclose()
+
+    def start_listener(self):
+        if self.use_pubsub and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop_listener(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+identity_cache = IdentityCache(IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL, IDENTITY_CACHE_PUBSUB)
@@ -0,0 +1,126 @@
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess, start_http_server
+from sqlalchemy import event
+
+# Задержки Telegram-бота: от миллисекунд (кэш) до секунд (графики)
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+# ОБРАБОТЧИКИ
+HANDLER_DURATION = Histogram(
+    "habitflow_handler_duration_seconds", "Время обработки апдейта обработчиком",
+    ["router", "handler", "action"], buckets=LATENCY_BUCKETS,
+)
+HANDLER_ERRORS = Counter(
+    "habitflow_handler_errors_total", "Исключения в обработчиках",
+    ["router", "handler", "action"],
+)
+
+# БАЗА ДАННЫХ
+DB_QUERIES_PER_UPDATE = Histogram(
+    "habitflow_db_queries_per_update", "SQL-запросов на один апдейт",
+    ["router", "action"], buckets=QUERY_BUCKETS,
+)
+DB_TIME_PER_UPDATE = Histogram(
+    "habitflow_db_seconds_per_update", "Суммарное время SQL-запросов одного апдейта",
+    ["router", "action"], buckets=LATENCY_BUCKETS,
+)
+DB_STATEMENT_DURATION = Histogram(
+    "habitflow_db_statement_duration_seconds", "Время одного SQL-запроса",
+    buckets=LATENCY_BUCKETS,
+)
+
+# ГРАФИКИ
+CHART_DURATION = Histogram(
+    "habitflow_chart_seconds", "Подготовка графика: выборка отметок, очередь и отрисовка",
+    ["days"], buckets=LATENCY_BUCKETS,
+)
+CHART_QUEUE_FULL = Counter("habitflow_chart_queue_full_total", "Отказы в графике из-за переполненной очереди")
+CHART_BYTES = Histogram(
+    "habitflow_chart_bytes", "Размер закодированной картинки графика",
+    ["format", "days"], buckets=(10_000, 20_000, 40_000, 60_000, 80_000, 100_000, 150_000, 250_000, 500_000),
+)
+
+# BOT API
+BOT_API_DURATION = Histogram(
+    "habitflow_bot_api_duration_seconds", "Время запроса к Bot API",
+    ["method"], buckets=LATENCY_BUCKETS,
+)
+BOT_API_ERRORS = Counter(
+    "habitflow_bot_api_errors_total", "Ошибки запросов к Bot API",
+    ["method", "error"],
+)
+
+# НАПОМИНАНИЯ (Celery)
+REMINDERS_SCHEDULED = Counter("habitflow_reminders_scheduled_total", "Получателей поставлено в рассылку")
+REMINDER_BATCHES = Counter("habitflow_reminder_batches_total", "Обработано пачек рассылки")
+REMINDERS_DELIVERED = Counter(
+    "habitflow_reminders_delivered_total", "Итоги доставки напоминаний",
+    ["status"],
+)
+REMINDER_BATCH_DURATION = Histogram(
+    "habitflow_reminder_batch_seconds", "Время рассылки одной пачки",
+    buckets=(.1, .5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+
+# ОЧЕРЕДЬ АПДЕЙТОВ (UPDATE_FANOUT=1): обновляет bot.worker раз в UPDATE_STATS_INTERVAL;
+# пишет один процесс, поэтому в многопроцессном режиме берём его последнее значение
+UPDATE_STREAM_LENGTH = Gauge(
+    "habitflow_update_stream_length", "Апдейтов в потоке раздела",
+    ["partition"], multiprocess_mode="livemostrecent",
+)
+UPDATE_STREAM_PENDING = Gauge(
+    "habitflow_update_stream_pending", "Апдейтов раздела, выданных воркеру и ещё не обработанных",
+    ["partition"], multiprocess_mode="livemostrecent",
+)
+UPDATE_STREAM_LAG = Gauge(
+    "habitflow_update_stream_lag", "Апдейтов раздела, ещё не выданных воркерам",
+    ["partition"], multiprocess_mode="livemostrecent",
+)
+UPDATE_STREAM_LAG_SECONDS = Gauge(
+    "habitflow_update_stream_lag_seconds", "Возраст самого старого невыданного апдейта раздела",
+    ["partition"], multiprocess_mode="livemostrecent",
+)
+
+
+# Счётчик SQL текущего апдейта: [запросов, секунд]; None — вне апдейта
+update_queries = ContextVar("update_queries", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+    DB_STATEMENT_DURATION.observe(elapsed)
+    counter = update_queries.get()
+    if counter is not None:
+        counter[0] += 1
+        counter[1] += elapsed
+
+
+# Подключает замер SQL-запросов к движку SQLAlchemy
+def instrument_engine(engine):
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# Реестр для выдачи: в многопроцессном режиме собирает метрики всех процессов
+def metrics_registry():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+# Отдаёт /metrics на отдельном порту (в фоновом потоке)
+def start_metrics_server(port: int):
+    if port:
+        start_http_server(port, registry=metrics_registry())
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+
+from redis.exceptions import RedisError
+
+from bot.services.redis_client import get_redis
+from config import PROFILING, PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, PROFILE_DIR, PROFILE_KEEP
+
+logger = logging.getLogger(__name__)
+
+# В имени файла профиля остаются только буквы, цифры, '_' и '-'
+_UNSAFE = re.compile(r"[^\w-]+")
+
+SETTINGS_CHANNEL = "profiling:settings"
+# Какие настройки можно менять на лету
+SETTINGS = ("enabled", "sample_rate", "slow_ms")
+
+
+class UpdateProfiler:
+    """
+    Настройки профилирования апдейтов и хранилище профилей.
+
+    Профилируется доля sample_rate апдейтов, сохраняются только те, что
+    обрабатывались дольше slow_ms. Файлы .prof (формат pstats) лежат в
+    directory, старые удаляются, когда их больше keep. Настройки меняются
+    на лету командой /profiling: изменивший их процесс рассылает изменения
+    в Redis pub/sub, и их применяют все запущенные процессы бота и bot.worker.
+    Процессы, запущенные позже, берут настройки из окружения.
+    """
+
+    def __init__(self, enabled: bool, sample_rate: float, slow_ms: int, directory: str, keep: int):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.directory = directory
+        self.keep = keep
+        # cProfile профилирует весь поток, поэтому одновременно — один апдейт
+        self.busy = False
+        self.saved = 0
+        self._listener = None
+
+    # Профилировать ли очередной апдейт
+    def sample(self) -> bool:
+        return self.enabled and not self.busy and random.random() < self.sample_rate
+
+    # Сохраняет профиль апдейта; возвращает путь к файлу или None
+    async def save(self, profile, update_id: int, labels: tuple, elapsed_ms: float):
+        if elapsed_ms < self.slow_ms:
+            return None
+        tags = ".".join(_UNSAFE.sub("_", str(label)) for label in labels)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{int(elapsed_ms):06d}ms_{tags}_{update_id}.prof"
+        path = os.path.join(self.directory, name)
+        try:
+            await asyncio.to_thread(self._write, profile, path)
+        except OSError as e:
+            logger.warning("Не удалось сохранить профиль %s: %s", path, e)
+            return None
+        self.saved += 1
+        return path
+
+    def _write(self, profile, path: str):
+        os.makedirs(self.directory, exist_ok=True)
+        profile.dump_stats(path)
+        # Имена начинаются с времени — по имени сортируются от старых к новым
+        for old in self.recent(limit=None)[self.keep:]:
+            os.remove(os.path.join(self.directory, old))
+
+    # Имена сохранённых профилей, от новых к старым
+    def recent(self, limit: int | None = 5) -> list[str]:
+        try:
+            names = sorted((n for n in os.listdir(self.directory) if n.endswith(".prof")), reverse=True)
+        except FileNotFoundError:
+            return []
+        return names if limit is None else names[:limit]
+
+    # НАСТРОЙКИ ВО ВСЕХ ПРОЦЕССАХ
+    async def configure(self, **settings):
+        """Меняет настройки в этом процессе и рассылает изменения остальным"""
+        self._apply(settings)
+        try:
+            await get_redis().publish(SETTINGS_CHANNEL, json.dumps(settings))
+        except RedisError as e:
+            logger.warning("Не удалось разослать настройки профилирования: %s", e)
+
+    def _apply(self, settings: dict):
+        for name, value in settings.items():
+            if name in SETTINGS:
+                setattr(self, name, value)
+
+    async def _listen(self):
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                await pubsub.subscribe(SETTINGS_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._apply(json.loads(message["data"]))
+            except RedisError as e:
+                logger.warning("Подписка на настройки профилирования прервана: %s", e)
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.aclose()
+
+    def start_listener(self):
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop_listener(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def status(self) -> str:
+        slow = f"дольше {self.slow_ms} мс" if self.slow_ms else "все"
+        return (
+            f"Профилирование: {'включено' if self.enabled else 'выключено'}\n"
+            f"Доля апдейтов: {self.sample_rate:g}\n"
+            f"Сохраняются: {slow}\n"
+            f"Каталог: {self.directory} (хранится {self.keep}, сохранено с запуска {self.saved})"
+        )
+
+
+# Один на процесс
+update_profiler = UpdateProfiler(PROFILING, PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, PROFILE_DIR, PROFILE_KEEP)
@@ -0,0 +1,57 @@
+import re
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# Номера параметров с приведением типа ($1::VARCHAR, $2::TIMESTAMP WITHOUT TIME ZONE, $3::INTEGER[])
+# и развёрнутые списки IN (...) не меняют «форму» запроса
+_PARAM = re.compile(r"\$\d+(?:::[A-Z_]+(?: WITH(?:OUT)? TIME ZONE)?(?:\[\])?)?")
+_PARAM_LIST = re.compile(r"\(\s*\$\?(\s*,\s*\$\?)*\s*\)")
+
+
+class QueryBudgetExceeded(Exception):
+    """Апдейт выполнил слишком много SQL-запросов или повторял один запрос (N+1)"""
+
+
+# Запрос без значений параметров: одинаковые запросы с разными id совпадают
+def statement_shape(statement: str) -> str:
+    shape = _PARAM.sub("$?", statement)
+    shape = _PARAM_LIST.sub("($?, ...)", shape)
+    return " ".join(shape.split())
+
+
+class QueryLog:
+    """SQL-запросы одного апдейта"""
+
+    def __init__(self):
+        self.statements = []
+
+    def problems(self, budget: int, repeat_limit: int) -> list[str]:
+        problems = []
+        if budget and len(self.statements) > budget:
+            problems.append(f"{len(self.statements)} запросов при бюджете {budget}")
+
+        shapes = Counter(statement_shape(s) for s in self.statements)
+        for shape, count in shapes.most_common():
+            if count <= repeat_limit:
+                break
+            problems.append(f"N+1: {count} раз {shape[:300]}")
+        return problems
+
+
+# Журнал запросов текущего апдейта; None — проверка выключена или вне апдейта
+current_query_log = ContextVar("current_query_log", default=None)
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    query_log = current_query_log.get()
+    if query_log is not None:
+        query_log.statements.append(statement)
+
+
+# Подключает журнал запросов к движку SQLAlchemy
+def watch_engine(engine):
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _record_statement):
+        event.listen(sync_engine, "before_cursor_execute", _record_statement)
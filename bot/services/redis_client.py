@@ -0,0 +1,20 @@
+from redis.asyncio import Redis
+
+from config import REDIS_URL
+
+_redis = None
+
+
+# Общий клиент Redis для бота (создаётся при первом обращении)
+def get_redis() -> Redis:
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(REDIS_URL)
+    return _redis
+
+
+async def close_redis():
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import pytz
+
+
+def parse_timezone(tz_str: str):
+    """Конвертирует строку типа UTC+3 в формат pytz"""
+    if tz_str.startswith('UTC'):
+        offset = int(tz_str[3:] or 0)
+        if offset > 0:
+            return f'Etc/GMT-{offset}'
+        elif offset < 0:
+            return f'Etc/GMT+{abs(offset)}'
+        else:
+            return 'UTC'
+    return tz_str
+
+
+# Минута суток по UTC, в которую пользователю приходит напоминание
+def reminder_minute_utc(reminder_time: str, timezone: str, now: datetime = None) -> int:
+    """
+    По этой минуте периодическая задача находит пользователей, которым пора напомнить.
+    Для поясов с переходом на летнее время значение считается на текущую дату.
+    """
+    tz = pytz.timezone(parse_timezone(timezone))
+    now = now or datetime.now(pytz.UTC)
+
+    target_time = datetime.strptime(reminder_time, "%H:%M").time()
+    target_dt = tz.localize(datetime.combine(now.astimezone(tz).date(), target_time))
+
+    utc_time = target_dt.astimezone(pytz.UTC)
+    return utc_time.hour * 60 + utc_time.minute
@@ -0,0 +1,164 @@
+from datetime import date, timedelta
+
+from sqlalchemy import Integer, case, cast, func, select, update
+
+from bot.database.models import Habit, HabitLog
+
+
+# Считает состояние серии по датам выполнений
+def compute_streak_state(dates) -> tuple[int, int, date | None]:
+    """
+    Считает состояние серии по списку дат выполнений.
+
+    :return: (серия, заканчивающаяся на последней дате; лучшая серия; последняя дата)
+    """
+    current = 0
+    longest = 0
+    last_date = None
+
+    for log_date in sorted(set(dates)):
+        if last_date is not None and log_date - last_date == timedelta(days=1):
+            current += 1
+        else:
+            current = 1
+        longest = max(longest, current)
+        last_date = log_date
+
+    return current, longest, last_date
+
+
+# Серия, которую видит пользователь
+def displayed_streak(habit: Habit, today: date) -> int:
+    """Серия засчитывается, только если привычка отмечена сегодня."""
+    if habit.last_completed_date == today:
+        return habit.current_streak or 0
+    return 0
+
+
+# Список активных привычек пользователя с серией и отметкой за сегодня (один запрос)
+def habits_overview_query(user_id: int, today: date):
+    logged_today = Habit.last_completed_date == today
+    return (
+        select(
+            Habit.id,
+            Habit.name,
+            case((logged_today, Habit.current_streak), else_=0).label("streak"),
+            func.coalesce(logged_today, False).label("logged_today"),
+        )
+        .where(Habit.user_id == user_id, Habit.is_active == True)
+        .order_by(Habit.id)
+    )
+
+
+# Состояние серий по истории одним запросом (gaps-and-islands)
+def streak_islands_query(habit_ids=None):
+    """
+    Дни подряд образуют «остров»: у них совпадает date - row_number().
+    Текущая серия — длина самого позднего острова, лучшая — самого длинного.
+    """
+    days = (
+        select(HabitLog.habit_id, HabitLog.date)
+        .where(HabitLog.completed == True)
+        .distinct()
+    )
+    if habit_ids is not None:
+        days = days.where(HabitLog.habit_id.in_(habit_ids))
+    days = days.subquery()
+
+    grouped = select(
+        days.c.habit_id,
+        days.c.date,
+        (days.c.date - cast(func.row_number().over(
+            partition_by=days.c.habit_id, order_by=days.c.date
+        ), Integer)).label("island"),
+    ).subquery()
+
+    islands = (
+        select(
+            grouped.c.habit_id,
+            func.count().label("length"),
+            func.max(grouped.c.date).label("end_date"),
+        )
+        .group_by(grouped.c.habit_id, grouped.c.island)
+        .subquery()
+    )
+
+    ranked = select(
+        islands,
+        func.row_number().over(
+            partition_by=islands.c.habit_id, order_by=islands.c.end_date.desc()
+        ).label("recency"),
+    ).subquery()
+
+    return (
+        select(
+            ranked.c.habit_id,
+            func.max(case((ranked.c.recency == 1, ranked.c.length), else_=0)).label("current_streak"),
+            func.max(ranked.c.length).label("longest_streak"),
+            func.max(ranked.c.end_date).label("last_completed_date"),
+        )
+        .group_by(ranked.c.habit_id)
+    )
+
+
+# Пересчёт серий всех привычек (или только указанных)
+async def rebuild_streaks(session, habit_ids=None) -> int:
+    reset = update(Habit).values(current_streak=0, longest_streak=0, last_completed_date=None)
+    if habit_ids is not None:
+        reset = reset.where(Habit.id.in_(habit_ids))
+    await session.execute(reset)
+
+    rows = (await session.execute(streak_islands_query(habit_ids))).all()
+    if rows:
+        await session.execute(update(Habit), [
+            {
+                "id": row.habit_id,
+                "current_streak": row.current_streak,
+                "longest_streak": row.longest_streak,
+                "last_completed_date": row.last_completed_date,
+            }
+            for row in rows
+        ])
+
+    return len(rows)
+
+
+# Полный пересчёт серии одной привычки по истории
+async def rebuild_habit_streak(session, habit: Habit):
+    row = (await session.execute(streak_islands_query([habit.id]))).first()
+
+    habit.current_streak = row.current_streak if row else 0
+    habit.longest_streak = row.longest_streak if row else 0
+    habit.last_completed_date = row.last_completed_date if row else None
+
+
+# Обновляет серию после новой отметки (в той же транзакции, что и сама отметка)
+async def record_completion(session, habit: Habit, log_date: date):
+    last_date = habit.last_completed_date
+
+    # Отметка задним числом ломает инкрементальный расчёт — пересчитываем
+    if last_date is not None and log_date <= last_date:
+        await rebuild_habit_streak(session, habit)
+        return
+
+    if last_date is not None and log_date - last_date == timedelta(days=1):
+        habit.current_streak = (habit.current_streak or 0) + 1
+    else:
+        habit.current_streak = 1
+
+    habit.last_completed_date = log_date
+    habit.longest_streak = max(habit.longest_streak or 0, habit.current_streak)
+
+
+# Обновляет серию после отмены отметки (вызывать после удаления лога)
+async def revoke_completion(session, habit: Habit, log_date: date):
+    current = habit.current_streak or 0
+
+    # Простой случай: убрали последний день серии, а серия не была рекордной
+    if habit.last_completed_date == log_date and 1 < current < (habit.longest_streak or 0):
+        habit.current_streak = current - 1
+        habit.last_completed_date = log_date - timedelta(days=1)
+        return
+
+    # Иначе (обнуление серии, рекорд, отмена старой даты) — пересчёт по истории
+    await rebuild_habit_streak(session, habit)
@@ -0,0 +1,103 @@
+import json
+import logging
+import time
+
+from redis.exceptions import ResponseError
+
+from bot.services.redis_client import get_redis
+from config import UPDATE_PARTITIONS, UPDATE_STREAM_MAXLEN
+
+logger = logging.getLogger(__name__)
+
+STREAM_PREFIX = "updates:"
+CONSUMER_GROUP = "bot-workers"
+
+
+def stream_name(partition: int) -> str:
+    return f"{STREAM_PREFIX}{partition}"
+
+
+# Пользователь, от которого пришёл апдейт (сырой JSON Bot API)
+def update_user_id(update: dict) -> int:
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        sender = event.get("from") or event.get("user") or event.get("chat")
+        if sender is None and isinstance(event.get("message"), dict):
+            sender = event["message"].get("chat")
+        if sender is not None:
+            return sender["id"]
+    return 0
+
+
+# Раздел потока: все апдейты одного пользователя попадают в один раздел
+def partition_for(user_id: int) -> int:
+    """Число разделов нельзя менять, пока в потоках есть необработанные апдейты"""
+    return user_id % UPDATE_PARTITIONS
+
+
+# Кладёт апдейт в поток своего раздела
+async def publish_update(update: dict):
+    partition = partition_for(update_user_id(update))
+    await get_redis().xadd(
+        stream_name(partition),
+        {"update": json.dumps(update, ensure_ascii=False)},
+        maxlen=UPDATE_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+# Создаёт группу потребителей раздела (если её ещё нет)
+async def ensure_group(partition: int):
+    try:
+        await get_redis().xgroup_create(stream_name(partition), CONSUMER_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _id_ms(entry_id) -> int:
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    return int(str(entry_id).split("-")[0])
+
+
+# Глубина очереди и отставание воркеров по каждому разделу
+async def stream_stats() -> list[dict]:
+    """
+    :return: по разделу — длина потока (length), выданные воркеру, но ещё не
+             обработанные апдейты (pending), ещё не выданные (lag) и возраст
+             самого старого невыданного апдейта в секундах (lag_seconds)
+    """
+    redis = get_redis()
+    now_ms = int(time.time() * 1000)
+    stats = []
+    for partition in range(UPDATE_PARTITIONS):
+        stream = stream_name(partition)
+        row = {"partition": partition, "length": await redis.xlen(stream),
+               "pending": 0, "lag": 0, "lag_seconds": 0.0}
+        if row["length"]:
+            try:
+                groups = await redis.xinfo_groups(stream)
+            except ResponseError:
+                groups = []
+
+            # Пока группы нет (воркеры ещё не запускались), ждёт весь поток
+            delivered = "0-0"
+            row["lag"] = row["length"]
+            for group in groups:
+                name = group["name"].decode() if isinstance(group["name"], bytes) else group["name"]
+                if name == CONSUMER_GROUP:
+                    row["pending"] = group["pending"]
+                    row["lag"] = group.get("lag") or 0
+                    delivered = group["last-delivered-id"]
+                    if isinstance(delivered, bytes):
+                        delivered = delivered.decode()
+
+            waiting = await redis.xrange(stream, min=f"({delivered}", count=1)
+            if waiting:
+                row["lag_seconds"] = max(0, now_ms - _id_ms(waiting[0][0])) / 1000
+            else:
+                row["lag"] = 0
+        stats.append(row)
+    return stats
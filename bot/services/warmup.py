@@ -0,0 +1,27 @@
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Тяжёлые модули, которые процесс бота импортирует только при первом графике
+LAZY_MODULES = ("numpy",)
+
+
+def _import_all(modules):
+    started = time.perf_counter()
+    for name in modules:
+        importlib.import_module(name)
+    logger.info("Прогрев: %s загружены за %.0f мс", ", ".join(modules), (time.perf_counter() - started) * 1000)
+
+
+# Загружает ленивые модули в фоновом потоке, пока бот уже принимает апдейты
+def warm_up_in_background(modules=LAZY_MODULES) -> threading.Thread:
+    """
+    Обработчик, которому модуль понадобится раньше, просто дождётся
+    окончания импорта (блокировка импорта общая), повторной загрузки не будет.
+    """
+    thread = threading.Thread(target=_import_all, args=(modules,), name="warmup", daemon=True)
+    thread.start()
+    return thread
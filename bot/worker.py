@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+
+from bot.services.redis_client import get_redis
+from bot.services.update_stream import CONSUMER_GROUP, ensure_group, stream_name, stream_stats
+from config import UPDATE_PARTITIONS, UPDATE_WORKERS, UPDATE_READ_BATCH, UPDATE_STATS_INTERVAL, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Сколько апдейт может висеть необработанным у упавшего воркера, прежде чем его заберёт другой
+CLAIM_IDLE_MS = 60_000
+# Как часто проверять чужие зависшие апдейты, с
+CLAIM_INTERVAL = 30
+
+
+# Забирает себе апдейты, выданные упавшему воркеру и так и не подтверждённые; возвращает их число
+async def claim_stale(redis, stream: str, consumer: str) -> int:
+    claimed = 0
+    cursor = "0-0"
+    while True:
+        # За один вызов XAUTOCLAIM просматривает не больше count записей — идём по курсору до конца
+        cursor, entries, *_ = await redis.xautoclaim(
+            stream, CONSUMER_GROUP, consumer, min_idle_time=CLAIM_IDLE_MS, start_id=cursor, count=100
+        )
+        claimed += len(entries)
+        if cursor in (b"0-0", "0-0"):
+            return claimed
+
+
+async def consume_partition(bot, dp, partition: int, consumer: str):
+    """
+    Обрабатывает один раздел: апдейты по очереди, поэтому порядок для
+    пользователя сохраняется — пока раздел читает один потребитель.
+    Разделы распределяются между процессами одного хоста; если в одной
+    группе запущены воркеры на двух хостах, каждый раздел читают оба,
+    и апдейты одного пользователя могут обработаться параллельно.
+    """
+    redis = get_redis()
+    stream = stream_name(partition)
+    await ensure_group(partition)
+
+    # Сначала — свои неподтверждённые апдейты (после перезапуска) и забранные у упавших воркеров, затем новые
+    await claim_stale(redis, stream, consumer)
+    next_claim = time.monotonic() + CLAIM_INTERVAL
+    last_id = "0"
+    while True:
+        if last_id == ">" and time.monotonic() >= next_claim:
+            next_claim = time.monotonic() + CLAIM_INTERVAL
+            if await claim_stale(redis, stream, consumer):
+                last_id = "0"
+
+        response = await redis.xreadgroup(
+            CONSUMER_GROUP, consumer, {stream: last_id}, count=UPDATE_READ_BATCH, block=5000
+        )
+        entries = response[0][1] if response else []
+        if not entries:
+            last_id = ">"
+            continue
+
+        for entry_id, fields in entries:
+            try:
+                await dp.feed_raw_update(bot, json.loads(fields[b"update"]))
+            except Exception:
+                # Сбойный апдейт не должен останавливать раздел
+                logger.exception("Ошибка обработки апдейта %s из раздела %s", entry_id, partition)
+            await redis.xack(stream, CONSUMER_GROUP, entry_id)
+
+
+# Глубина очереди и отставание: в лог и в метрики /metrics
+async def log_stats():
+    # prometheus_client — только после того, как main() задал PROMETHEUS_MULTIPROC_DIR
+    from bot.services.metrics import (
+        UPDATE_STREAM_LAG, UPDATE_STREAM_LAG_SECONDS, UPDATE_STREAM_LENGTH, UPDATE_STREAM_PENDING,
+    )
+
+    while True:
+        for row in await stream_stats():
+            partition = str(row["partition"])
+            UPDATE_STREAM_LENGTH.labels(partition).set(row["length"])
+            UPDATE_STREAM_PENDING.labels(partition).set(row["pending"])
+            UPDATE_STREAM_LAG.labels(partition).set(row["lag"])
+            UPDATE_STREAM_LAG_SECONDS.labels(partition).set(row["lag_seconds"])
+            if row["length"]:
+                logger.info(
+                    "Раздел %(partition)s: в потоке %(length)s, в обработке %(pending)s, "
+                    "ждут %(lag)s, отставание %(lag_seconds).1f с", row
+                )
+        await asyncio.sleep(UPDATE_STATS_INTERVAL)
+
+
+# Воркер index из workers: берёт разделы, у которых номер % workers == index
+async def run_worker(index: int, workers: int):
+    from bot.main import bot, dp
+
+    partitions = [p for p in range(UPDATE_PARTITIONS) if p % workers == index]
+    consumer = f"{socket.gethostname()}-{index}"
+    logger.info("Воркер %s: разделы %s", consumer, partitions)
+
+    await dp.emit_startup(bot=bot)
+    tasks = [asyncio.create_task(consume_partition(bot, dp, p, consumer)) for p in partitions]
+    if index == 0:
+        tasks.append(asyncio.create_task(log_stats()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+
+def _worker_process(index: int, workers: int):
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_worker(index, workers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обработчики апдейтов из Redis Streams")
+    parser.add_argument("--workers", type=int, default=UPDATE_WORKERS, help="сколько процессов запустить")
+    parser.add_argument("--stats", action="store_true", help="вывести глубину очереди и отставание и выйти")
+    args = parser.parse_args()
+
+    if args.stats:
+        print(json.dumps(asyncio.run(stream_stats()), indent=2))
+        return
+
+    workers = max(1, min(args.workers, UPDATE_PARTITIONS))
+    if workers > 1 and METRICS_PORT:
+        # Метрики процессов-воркеров собираются через файлы в общем каталоге;
+        # переменную нужно задать до импорта prometheus_client
+        os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="habitflow-metrics-"))
+
+    from bot.services.metrics import start_metrics_server
+    start_metrics_server(METRICS_PORT)
+
+    if workers == 1:
+        _worker_process(0, 1)
+        return
+
+    # Каждый процесс — на своём ядре, со своим event loop и пулом соединений
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_worker_process, args=(i, workers)) for i in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
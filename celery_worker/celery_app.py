@@ -1,8 +1,18 @@
 import os
+import tempfile
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import worker_process_shutdown, worker_ready
+
+from config import CELERY_METRICS_PORT
 
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
 
+# Метрики процессов пула собираются через файлы в общем каталоге;
+# переменную нужно задать до импорта prometheus_client (задачи импортируются позже)
+if CELERY_METRICS_PORT:
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='habitflow-celery-metrics-'))
+
 celery_app = Celery(
     'habits',
     broker=REDIS_URL,
@@ -18,4 +28,33 @@ celery_app.conf.update(
     enable_utc=True,
     broker_connection_retry_on_startup=True,
     result_expires=3600,
+    # Рассылка живёт в своей очереди: её обрабатывает один процесс,
+    # чтобы лимит частоты Telegram соблюдался на весь бот
+    task_routes={
+        'celery_worker.tasks.send_reminder': {'queue': 'reminders'},
+        'celery_worker.tasks.send_reminder_batch': {'queue': 'reminders'},
+    },
 )
+
+# Один тик в минуту вместо отложенной задачи на каждого пользователя
+celery_app.conf.beat_schedule = {
+    'dispatch-due-reminders': {
+        'task': 'celery_worker.tasks.dispatch_due_reminders',
+        'schedule': crontab(),
+        'options': {'expires': 50},
+    },
+}
+
+
+# /metrics отдаёт главный процесс воркера — с метриками всех процессов пула
+@worker_ready.connect
+def start_metrics(**kwargs):
+    from bot.services.metrics import start_metrics_server
+    start_metrics_server(CELERY_METRICS_PORT)
+
+
+@worker_process_shutdown.connect
+def forget_process_metrics(pid=None, **kwargs):
+    if CELERY_METRICS_PORT and pid:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,10 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import DATABASE_URL
+
+# Задачи Celery синхронные, поэтому им нужен обычный драйвер вместо asyncpg
+SYNC_DATABASE_URL = DATABASE_URL.replace("+asyncpg", "+psycopg2")
+
+engine = create_engine(SYNC_DATABASE_URL, pool_pre_ping=True)
+session_maker = sessionmaker(engine, expire_on_commit=False)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+import time
+
+import aiohttp
+
+from config import TELEGRAM_GLOBAL_RATE, TELEGRAM_PER_CHAT_INTERVAL, REMINDER_SEND_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 4
+
+
+class TokenBucket:
+    """Ограничитель частоты: не больше rate запросов в секунду (с запасом burst)"""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Telegram прислал 429 — останавливаем все отправки на retry_after"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class TelegramSender:
+    """
+    Отправка сообщений через одну keep-alive сессию aiohttp.
+
+    Соблюдает общий лимит Bot API (TELEGRAM_GLOBAL_RATE сообщений/сек) и
+    интервал между сообщениями в один чат, выполняет retry_after из ответов 429.
+    Лимит действует в пределах процесса, поэтому рассылку держим в отдельной
+    очереди с одним процессом-воркером (см. docker-compose.yml).
+    """
+
+    def __init__(self, token: str, global_rate: float, per_chat_interval: float, concurrency: int):
+        self.url = f"https://api.telegram.org/bot{token}/sendMessage"
+        self.bucket = TokenBucket(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self.concurrency = concurrency
+        self._chat_sent_at = {}
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=15),
+            )
+        return self._session
+
+    async def _wait_for_chat(self, chat_id: int):
+        last = self._chat_sent_at.get(chat_id)
+        if last is not None:
+            delay = last + self.per_chat_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self._chat_sent_at[chat_id] = time.monotonic()
+
+    async def send_message(self, chat_id: int, text: str) -> str:
+        """
+        :return: "sent", "blocked" (бот заблокирован / чат недоступен) или "failed"
+        """
+        payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
+
+        for attempt in range(MAX_ATTEMPTS):
+            await self._wait_for_chat(chat_id)
+            await self.bucket.acquire()
+            try:
+                async with self._get_session().post(self.url, json=payload) as response:
+                    data = await response.json(content_type=None)
+            # ValueError — не JSON в ответе (HTML-страница балансировщика, пустое тело): повторяем, как 5xx
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning("Сбой отправки в %s (попытка %s): %s", chat_id, attempt + 1, e)
+                await asyncio.sleep(2 ** attempt)
+                continue
+
+            if response.status == 200:
+                return "sent"
+            if response.status == 429:
+                retry_after = (data.get("parameters") or {}).get("retry_after", 1)
+                self.bucket.pause(retry_after)
+                continue
+            if response.status == 403:
+                return "blocked"
+            if response.status >= 500:
+                await asyncio.sleep(2 ** attempt)
+                continue
+
+            logger.warning("Telegram отклонил сообщение в %s: %s", chat_id, data.get("description"))
+            return "failed"
+
+        return "failed"
+
+    async def send_batch(self, chat_ids, text: str) -> dict:
+        """Отправляет одно сообщение многим чатам, возвращает итоги по пачке"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        # Забываем чаты, интервал для которых уже истёк
+        expired = time.monotonic() - self.per_chat_interval
+        self._chat_sent_at = {c: t for c, t in self._chat_sent_at.items() if t > expired}
+
+        async def send(chat_id):
+            async with semaphore:
+                return chat_id, await self.send_message(chat_id, text)
+
+        results = await asyncio.gather(*(send(chat_id) for chat_id in chat_ids))
+
+        report = {"sent": 0, "blocked": 0, "failed": 0, "blocked_ids": []}
+        for chat_id, status in results:
+            report[status] += 1
+            if status == "blocked":
+                report["blocked_ids"].append(chat_id)
+        return report
+
+
+# Один event loop и один отправитель на процесс воркера:
+# соединения и лимиты переживают отдельные задачи
+_loop = None
+_sender = None
+_pid = None
+
+
+def deliver(chat_ids, text: str) -> dict:
+    """Синхронная обёртка для задач Celery"""
+    global _loop, _sender, _pid
+    if _pid != os.getpid():
+        # после fork начинаем с чистого состояния
+        _loop = asyncio.new_event_loop()
+        _sender = TelegramSender(
+            os.getenv('BOT_TOKEN'),
+            TELEGRAM_GLOBAL_RATE,
+            TELEGRAM_PER_CHAT_INTERVAL,
+            REMINDER_SEND_CONCURRENCY,
+        )
+        _pid = os.getpid()
+    return _loop.run_until_complete(_sender.send_batch(chat_ids, text))
@@ -1,82 +1,108 @@
 from datetime import datetime, timedelta
-import pytz
-from .celery_app import celery_app
-import requests, redis
-import os
+import logging
 
+import redis
+from sqlalchemy import select, update
 
-@celery_app.task
-def send_reminder(user_id: int, text: str):
-    token = os.getenv('BOT_TOKEN')
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    data = {"chat_id": user_id, "text": text, "parse_mode": "HTML"}
-
-    try:
-        response = requests.post(url, json=data, timeout=10)
-        return response.status_code == 200
-    except Exception as e:
-        print(f"Ошибка отправки напоминания: {e}")
-        return False
-
-
-def parse_timezone(tz_str: str):
-    """Конвертирует строку типа UTC+3 в формат pytz"""
-    if tz_str.startswith('UTC'):
-        offset = int(tz_str[3:])
-        if offset > 0:
-            return f'Etc/GMT-{offset}'
-        elif offset < 0:
-            return f'Etc/GMT+{abs(offset)}'
-        else:
-            return 'UTC'
-    return tz_str
-
-
-async def update_user_task_id(user_id: int, task_id: str):
-    """Сохраняет ID задачи в БД"""
-    from bot.database.engine import async_session_maker
-    from bot.database.models import User
-    from sqlalchemy import update
-
-    async with async_session_maker() as session:
-        await session.execute(
-            update(User)
-            .where(User.telegram_id == user_id)
-            .values(reminder_task_id=task_id)
-        )
-        await session.commit()
+from bot.database.models import User
+from bot.services.identity_cache import INVALIDATION_CHANNEL
+from bot.services.metrics import REMINDER_BATCH_DURATION, REMINDER_BATCHES, REMINDERS_DELIVERED, REMINDERS_SCHEDULED
+from config import REDIS_URL, REMINDER_BATCH_SIZE, REMINDER_CATCHUP_MINUTES
+from .celery_app import celery_app
+from .db import session_maker
+from .delivery import deliver
 
+logger = logging.getLogger(__name__)
 
-@celery_app.task
-def schedule_user_reminder(user_id: int, reminder_time: str, timezone: str):
-    """Планирует одно напоминание на указанное время"""
-    try:
-        tz = pytz.timezone(parse_timezone(timezone))
-        now = datetime.now(tz)
+REMINDER_TEXT = "⏰ Время отмечать привычки!"
 
-        target_time = datetime.strptime(reminder_time, "%H:%M").time()
-        target_dt = tz.localize(datetime.combine(now.date(), target_time))
+_redis = None
 
-        if target_dt < now:
-            target_dt += timedelta(days=1)
 
-        utc_time = target_dt.astimezone(pytz.UTC)
-        seconds_until = (utc_time - datetime.now(pytz.UTC)).total_seconds()
+def get_redis():
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(REDIS_URL)
+    return _redis
 
-        if seconds_until > 0:
-            send_reminder.apply_async(
-                args=[user_id, "⏰ Время отмечать привычки!"],
-                countdown=int(seconds_until)
-            )
-            return True
-        return False
 
-    except Exception as e:
-        print(f"Ошибка планирования напоминания: {e}")
-        return False
+# Итоги доставки — в метрики
+def record_delivery(report: dict):
+    for status in ("sent", "blocked", "failed"):
+        REMINDERS_DELIVERED.labels(status).inc(report[status])
 
 
-@celery_app.task
-def cancel_user_reminders(user_id: int):
-    """Отмечает отмену напоминаний"""
-    return True
+@celery_app.task(ignore_result=True)
+def send_reminder(user_id: int, text: str):
+    report = deliver([user_id], text)
+    record_delivery(report)
+    return report["sent"] == 1
+
+
+@celery_app.task(ignore_result=True)
+def send_reminder_batch(chat_ids: list, text: str = REMINDER_TEXT):
+    """Рассылает напоминание пачке пользователей через общий отправитель процесса"""
+    with REMINDER_BATCH_DURATION.time():
+        report = deliver(chat_ids, text)
+    REMINDER_BATCHES.inc()
+    record_delivery(report)
+
+    # Заблокировавшим бота больше не напоминаем
+    blocked_ids = report.pop("blocked_ids")
+    if blocked_ids:
+        with session_maker() as session:
+            session.execute(
+                update(User)
+                .where(User.telegram_id.in_(blocked_ids))
+                .values(reminders_enabled=False)
+            )
+            session.commit()
+
+        # Процессы бота держат пользователей в кэше — сообщаем, что записи изменились
+        pipe = get_redis().pipeline()
+        for chat_id in blocked_ids:
+            pipe.publish(INVALIDATION_CHANNEL, f"celery:user:{chat_id}")
+        pipe.execute()
+
+    logger.info(
+        "Напоминания: пачка %s — отправлено %s, заблокировали %s, ошибок %s",
+        len(chat_ids), report["sent"], report["blocked"], report["failed"]
+    )
+    return report
+
+
+def claim_due_minutes(now: datetime) -> list:
+    """
+    Забирает минуты (UTC), которые ещё никто не обработал.
+    Каждая минута обрабатывается ровно один раз, даже если тик запустили дважды
+    или предыдущие тики опоздали (догоняем до REMINDER_CATCHUP_MINUTES назад).
+    """
+    minutes = []
+    for back in range(REMINDER_CATCHUP_MINUTES, -1, -1):
+        moment = now - timedelta(minutes=back)
+        if get_redis().set(f"reminders:tick:{moment:%Y%m%d%H%M}", 1, nx=True, ex=24 * 3600):
+            minutes.append(moment.hour * 60 + moment.minute)
+    return minutes
+
+
+@celery_app.task(ignore_result=True)
+def dispatch_due_reminders():
+    """Периодический тик (раз в минуту): находит, кому пора напомнить, и раздаёт пачками"""
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    minutes = claim_due_minutes(now)
+    if not minutes:
+        return 0
+
+    total = 0
+    with session_maker() as session:
+        result = session.execute(
+            select(User.telegram_id)
+            .where(User.reminders_enabled, User.reminder_minute_utc.in_(minutes))
+            .execution_options(yield_per=REMINDER_BATCH_SIZE)
+        )
+        for chat_ids in result.scalars().partitions():
+            send_reminder_batch.delay(list(chat_ids))
+            total += len(chat_ids)
+
+    REMINDERS_SCHEDULED.inc(total)
+    return total
@@ -4,4 +4,87 @@ import os
 load_dotenv()
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
-DATABASE_URL = os.getenv('DATABASE_URL')  # добавили URL БД
\ No newline at end of file
+DATABASE_URL = os.getenv('DATABASE_URL')  # добавили URL БД
+
+# Отрисовка графиков в пуле процессов
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', '2'))  # сколько графиков рисуется одновременно
+CHART_MAX_PENDING = int(os.getenv('CHART_MAX_PENDING', '8'))  # лимит очереди, сверх него — отказ
+CHART_WORKER_MAX_TASKS = int(os.getenv('CHART_WORKER_MAX_TASKS', '200'))  # перезапуск воркера после N графиков (0 — никогда)
+CHART_BACKEND = os.getenv('CHART_BACKEND', 'matplotlib')  # matplotlib или pillow — быстрее и легче, без matplotlib
+CHART_FONT = os.getenv('CHART_FONT', '')  # TTF-шрифт с кириллицей для pillow (по умолчанию — DejaVu Sans из matplotlib)
+CHART_FORMAT = os.getenv('CHART_FORMAT', 'png8')  # png, png8 — PNG с палитрой, webp или jpeg
+CHART_WIDTH = int(os.getenv('CHART_WIDTH', '1200'))  # предельная ширина картинки, px (фото больше 1280 Telegram всё равно уменьшит)
+CHART_MAX_BYTES = int(os.getenv('CHART_MAX_BYTES', '100000'))  # целевой размер картинки; сверх него — сильнее сжатие и меньше ширина (0 — без лимита)
+CHART_WARMUP = os.getenv('CHART_WARMUP', '1') == '1'  # 1 — после запуска в фоне загрузить numpy и процессы графиков; 0 — при первом графике
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+
+# Кэш готовых графиков статистики
+CHART_CACHE_SIZE = int(os.getenv('CHART_CACHE_SIZE', '256'))  # графиков в памяти процесса
+CHART_CACHE_MAX_BYTES = int(os.getenv('CHART_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))  # лимит памяти под кэш
+CHART_CACHE_REDIS = os.getenv('CHART_CACHE_REDIS', '0') == '1'  # общий кэш в Redis для нескольких процессов бота
+CHART_CACHE_TTL = int(os.getenv('CHART_CACHE_TTL', str(24 * 3600)))  # время жизни графика в Redis, сек
+
+# Повторная отправка одинаковых графиков по file_id Telegram (хранится в Redis)
+PHOTO_FILE_ID_TTL = int(os.getenv('PHOTO_FILE_ID_TTL', str(48 * 3600)))  # сек, 0 — не запоминать
+
+# Ежедневные напоминания (Celery beat раз в минуту выбирает тех, кому пора)
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', '100'))  # получателей в одной задаче рассылки
+REMINDER_CATCHUP_MINUTES = int(os.getenv('REMINDER_CATCHUP_MINUTES', '5'))  # сколько пропущенных минут догонять
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '25'))  # сообщений/сек на весь бот (лимит Telegram ~30)
+TELEGRAM_PER_CHAT_INTERVAL = float(os.getenv('TELEGRAM_PER_CHAT_INTERVAL', '1'))  # сек между сообщениями в один чат
+REMINDER_SEND_CONCURRENCY = int(os.getenv('REMINDER_SEND_CONCURRENCY', '20'))  # одновременных запросов к Bot API
+
+# Пул соединений с БД (бот: одна сессия на апдейт, см. bot/middlewares/db.py)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))  # постоянных соединений в пуле
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '5'))  # дополнительных соединений при пиковой нагрузке
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # пересоздавать соединение старше N сек
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '10'))  # сколько ждать свободного соединения, сек
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '100'))  # кэш prepared statements asyncpg (0 — выкл.)
+DB_COMMAND_TIMEOUT = float(os.getenv('DB_COMMAND_TIMEOUT', '30'))  # таймаут одного запроса, сек
+
+# Кэш пользователей и владельцев привычек в памяти процесса бота
+IDENTITY_CACHE_SIZE = int(os.getenv('IDENTITY_CACHE_SIZE', '10000'))  # записей каждого вида
+IDENTITY_CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL', '300'))  # время жизни записи, сек
+IDENTITY_CACHE_PUBSUB = os.getenv('IDENTITY_CACHE_PUBSUB', '1') == '1'  # инвалидация между процессами через Redis pub/sub
+
+# Хранилище состояний диалогов (FSM)
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory')  # memory — один процесс; redis — общее для нескольких процессов бота
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', str(24 * 3600)))  # брошенный диалог забывается через N сек (0 — никогда)
+FSM_DATA_TTL = int(os.getenv('FSM_DATA_TTL', str(24 * 3600)))  # то же для данных диалога
+
+# Способ получения апдейтов
+BOT_MODE = os.getenv('BOT_MODE', 'polling')  # polling — для разработки; webhook — для нескольких реплик за балансировщиком
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')  # публичный https-адрес бота, например https://bot.example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')  # путь, на который Telegram шлёт апдейты
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # секрет из заголовка X-Telegram-Bot-Api-Secret-Token (обязателен)
+WEBHOOK_DELETE_ON_SHUTDOWN = os.getenv('WEBHOOK_DELETE_ON_SHUTDOWN', '1') == '1'  # при нескольких репликах — 0
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')  # адрес, на котором слушает веб-сервер
+WEBAPP_PORT = int(os.getenv('WEBAPP_PORT', '8080'))  # порт веб-сервера
+
+# Раздача апдейтов воркерам через Redis Streams (один раздел — апдейты одних и тех же пользователей по порядку)
+UPDATE_FANOUT = os.getenv('UPDATE_FANOUT', '0') == '1'  # 1 — bot.main только принимает апдейты, обрабатывает python -m bot.worker
+UPDATE_PARTITIONS = int(os.getenv('UPDATE_PARTITIONS', '16'))  # число разделов (не менять при непустой очереди)
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '2'))  # процессов-обработчиков в python -m bot.worker
+UPDATE_STREAM_MAXLEN = int(os.getenv('UPDATE_STREAM_MAXLEN', '100000'))  # примерный предел длины потока раздела
+UPDATE_READ_BATCH = int(os.getenv('UPDATE_READ_BATCH', '10'))  # апдейтов за одно чтение из раздела
+UPDATE_STATS_INTERVAL = int(os.getenv('UPDATE_STATS_INTERVAL', '60'))  # как часто воркер пишет в лог глубину очереди, сек
+
+# Метрики Prometheus (/metrics на отдельном порту)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))  # порт бота и python -m bot.worker (0 — выкл.)
+CELERY_METRICS_PORT = int(os.getenv('CELERY_METRICS_PORT', '9101'))  # порт воркера Celery (0 — выкл.)
+
+# Проверка SQL-запросов апдейта (для разработки и бенчмарков)
+QUERY_BUDGET = os.getenv('QUERY_BUDGET', 'off')  # off, warn — писать в лог, raise — бросать QueryBudgetExceeded
+QUERY_BUDGET_LIMIT = int(os.getenv('QUERY_BUDGET_LIMIT', '10'))  # запросов на апдейт (0 — без лимита)
+QUERY_REPEAT_LIMIT = int(os.getenv('QUERY_REPEAT_LIMIT', '2'))  # сколько раз можно повторить один запрос (больше — N+1)
+
+# Профилирование медленных апдейтов (cProfile), включается и командой /profiling
+PROFILING = os.getenv('PROFILING', '0') == '1'  # 1 — профилировать сразу после запуска
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0.05'))  # доля профилируемых апдейтов (1 — все)
+PROFILE_SLOW_MS = int(os.getenv('PROFILE_SLOW_MS', '500'))  # сохранять профиль, только если апдейт дольше N мс (0 — всегда)
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/habitflow-profiles')  # каталог файлов .prof
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '200'))  # сколько последних профилей хранить
+
+# Администраторы бота (служебные команды)
+ADMIN_IDS = {int(i) for i in os.getenv('ADMIN_IDS', '').replace(' ', '').split(',') if i}  # telegram_id через запятую
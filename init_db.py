@@ -1,11 +1,10 @@
-from bot.database.engine import engine
-from bot.database.models import Base
-import asyncio
+from alembic import command
+from alembic.config import Config
 
-async def create_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+def create_tables():
+    # Схема ведётся миграциями (migrations/), create_all больше не используем
+    command.upgrade(Config("alembic.ini"), "head")
     print("✅ Таблицы созданы!")
 
 if __name__ == "__main__":
-    asyncio.run(create_tables())
\ No newline at end of file
+    create_tables()
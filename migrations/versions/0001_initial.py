@@ -0,0 +1,82 @@
+"""Начальная схема: users, habits, habit_logs, habit_notes
+
+Базы, созданные раньше через Base.metadata.create_all, достаточно
+пометить этой ревизией: alembic stamp 0001
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+        sa.Column('username', sa.String(length=100), nullable=True),
+        sa.Column('full_name', sa.String(length=200), nullable=False),
+        sa.Column('registered_at', sa.DateTime(), nullable=False),
+        sa.Column('timezone', sa.String(length=50), nullable=False),
+        sa.Column('reminders_enabled', sa.Boolean(), nullable=False),
+        sa.Column('reminder_time', sa.String(length=5), nullable=False),
+        sa.Column('reminder_task_id', sa.String(length=100), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_users_telegram_id', 'users', ['telegram_id'], unique=True)
+
+    op.create_table(
+        'habits',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('allow_notes', sa.Boolean(), nullable=False),
+        sa.Column('habit_type', sa.String(length=10), nullable=False),
+        sa.Column('numeric_unit', sa.String(length=20), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+    op.create_table(
+        'habit_logs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('habit_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('completed', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['habit_id'], ['habits.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+    op.create_table(
+        'habit_notes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('log_id', sa.Integer(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['log_id'], ['habit_logs.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('habit_notes')
+    op.drop_table('habit_logs')
+    op.drop_table('habits')
+    op.drop_index('ix_users_telegram_id', table_name='users')
+    op.drop_table('users')
@@ -0,0 +1,65 @@
+"""Состояние серии в habits: current_streak, longest_streak, last_completed_date
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 10:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_STREAKS = """
+    UPDATE habits h
+    SET current_streak = s.current_streak,
+        longest_streak = s.longest_streak,
+        last_completed_date = s.last_completed_date
+    FROM (
+        SELECT habit_id,
+               max(CASE WHEN recency = 1 THEN length ELSE 0 END) AS current_streak,
+               max(length) AS longest_streak,
+               max(end_date) AS last_completed_date
+        FROM (
+            SELECT habit_id, length, end_date,
+                   row_number() OVER (PARTITION BY habit_id ORDER BY end_date DESC) AS recency
+            FROM (
+                SELECT habit_id, count(*) AS length, max(date) AS end_date
+                FROM (
+                    SELECT habit_id, date,
+                           date - CAST(row_number() OVER (PARTITION BY habit_id ORDER BY date) AS integer) AS island
+                    FROM (SELECT DISTINCT habit_id, date FROM habit_logs WHERE completed) days
+                ) grouped
+                GROUP BY habit_id, island
+            ) islands
+        ) ranked
+        GROUP BY habit_id
+    ) s
+    WHERE h.id = s.habit_id
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('habits', sa.Column('current_streak', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('habits', sa.Column('longest_streak', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('habits', sa.Column('last_completed_date', sa.Date(), nullable=True))
+
+    # Заполняем состояние по уже накопленной истории одним запросом (gaps-and-islands):
+    # дни подряд образуют «остров» с одинаковым date - row_number(); текущая серия —
+    # самый поздний остров, лучшая — самый длинный
+    op.execute(BACKFILL_STREAKS)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('habits', 'last_completed_date')
+    op.drop_column('habits', 'longest_streak')
+    op.drop_column('habits', 'current_streak')
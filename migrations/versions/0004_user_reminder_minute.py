@@ -0,0 +1,51 @@
+"""Минута напоминания по UTC в users + частичный индекс для тика рассылки
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 12:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('reminder_minute_utc', sa.SmallInteger(), nullable=True))
+
+    # Пояса вида UTC±N (их пишет бот) — сдвигом на N часов; имена tz database (Europe/Moscow) —
+    # средствами PostgreSQL на текущую дату в поясе пользователя. Битые время или пояс
+    # оставляем пустыми: такой пользователь не попадёт в рассылку
+    op.execute(r"""
+        UPDATE users
+        SET reminder_minute_utc = CASE
+            WHEN timezone ~ '^UTC([+-]\d{1,2})?$' THEN
+                ((split_part(reminder_time, ':', 1)::integer * 60 + split_part(reminder_time, ':', 2)::integer
+                  - COALESCE(NULLIF(substring(timezone from 4), '')::integer, 0) * 60) % 1440 + 1440) % 1440
+            ELSE (extract(epoch from (
+                (((now() AT TIME ZONE timezone)::date + reminder_time::time) AT TIME ZONE timezone) AT TIME ZONE 'UTC'
+            )::time) / 60)::integer
+        END
+        WHERE reminder_time ~ '^([01]?\d|2[0-3]):[0-5]\d$'
+          AND (timezone ~ '^UTC([+-]\d{1,2})?$' OR timezone IN (SELECT name FROM pg_timezone_names))
+    """)
+
+    op.create_index(
+        'ix_users_reminder_due', 'users', ['reminder_minute_utc'],
+        postgresql_where=sa.text('reminders_enabled'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_reminder_due', table_name='users')
+    op.drop_column('users', 'reminder_minute_utc')
@@ -0,0 +1,55 @@
+"""Индексы: уникальная отметка (habit_id, date), активные привычки пользователя, пометки по log_id
+
+Перед созданием уникального индекса схлопывает дубли отметок за один день:
+остаётся самая ранняя, пометки дублей переносятся на неё.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 13:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+DUPLICATE_LOGS = """
+    SELECT id, min(id) OVER (PARTITION BY habit_id, date) AS keep_id
+    FROM habit_logs
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(f"""
+        UPDATE habit_notes n SET log_id = d.keep_id
+        FROM ({DUPLICATE_LOGS}) d
+        WHERE n.log_id = d.id AND d.id <> d.keep_id
+    """)
+    op.execute(f"""
+        DELETE FROM habit_logs l
+        USING ({DUPLICATE_LOGS}) d
+        WHERE l.id = d.id AND d.id <> d.keep_id
+    """)
+
+    op.create_index('uq_habit_logs_habit_date', 'habit_logs', ['habit_id', 'date'], unique=True)
+    op.create_index(
+        'ix_habits_user_active', 'habits', ['user_id'],
+        postgresql_where=sa.text('is_active'),
+    )
+    op.create_index('ix_habit_notes_log_id', 'habit_notes', ['log_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_habit_notes_log_id', table_name='habit_notes')
+    op.drop_index('ix_habits_user_active', table_name='habits')
+    op.drop_index('uq_habit_logs_habit_date', table_name='habit_logs')
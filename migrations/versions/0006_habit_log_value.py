@@ -0,0 +1,54 @@
+"""Числовое значение отметки в habit_logs.value
+
+Раньше количество хранилось только текстом пометки ("12 страниц").
+Значение берём из первой пометки отметки; отметка без числа считается за 1,
+как и при прежнем разборе текста на графике. Пометки не удаляются.
+Число длиннее, чем помещается в integer, ограничивается 2147483647
+(а не обрезается до первых цифр).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 13:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('habit_logs', sa.Column('value', sa.Integer(), nullable=True))
+
+    # слишком большие числа ограничиваем максимумом integer, а не обрезаем по цифрам
+    op.execute(r"""
+        UPDATE habit_logs l
+        SET value = COALESCE(
+            (
+                SELECT CASE
+                    WHEN substring(n.text from '\d+')::numeric > 2147483647 THEN 2147483647
+                    ELSE substring(n.text from '\d+')::integer
+                END
+                FROM habit_notes n
+                WHERE n.log_id = l.id
+                ORDER BY n.id
+                LIMIT 1
+            ),
+            1
+        )
+        FROM habits h
+        WHERE h.id = l.habit_id AND h.habit_type = 'numeric'
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('habit_logs', 'value')
@@ -0,0 +1,45 @@
+"""Таблица дневных сводок user_daily_stats для общей статистики
+
+Заполняется по уже существующим отметкам.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user_daily_stats',
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('completions', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('numeric_total', sa.BigInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'date'),
+    )
+
+    op.execute("""
+        INSERT INTO user_daily_stats (user_id, date, completions, numeric_total)
+        SELECT h.user_id, l.date, count(*), COALESCE(sum(l.value), 0)
+        FROM habit_logs l
+        JOIN habits h ON h.id = l.habit_id
+        GROUP BY h.user_id, l.date
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_daily_stats')
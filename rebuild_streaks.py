@@ -0,0 +1,12 @@
+from bot.database.engine import async_session_maker
+from bot.services.streaks import rebuild_streaks
+import asyncio
+
+async def main():
+    async with async_session_maker() as session:
+        count = await rebuild_streaks(session)
+        await session.commit()
+    print(f"✅ Серии пересчитаны ({count} привычек с отметками)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
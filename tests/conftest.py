@@ -0,0 +1,23 @@
+import asyncio
+import os
+
+import pytest
+
+# config.py читает окружение при импорте: задаём его раньше, чем тесты импортируют bot.
+# Тесты обработчиков работают с отдельной базой TEST_DATABASE_URL (она будет очищена)
+if os.getenv("TEST_DATABASE_URL"):
+    os.environ["DATABASE_URL"] = os.environ["TEST_DATABASE_URL"]
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://test@localhost/test")
+os.environ.setdefault("BOT_TOKEN", "0:test")
+# Лишний SQL-запрос или N+1 в обработчике роняет тест
+os.environ["QUERY_BUDGET"] = "raise"
+
+
+@pytest.fixture(scope="module")
+def loop():
+    # Один event loop на модуль: пул соединений движка привязан к нему
+    loop = asyncio.new_event_loop()
+    yield loop
+    from bot.database.engine import engine
+    loop.run_until_complete(engine.dispose())
+    loop.close()
@@ -0,0 +1,57 @@
+from bot.services.query_budget import QueryLog, statement_shape
+
+
+def test_shape_ignores_parameter_numbers():
+    first = statement_shape("SELECT habits.id FROM habits WHERE habits.user_id = $1::INTEGER")
+    second = statement_shape("SELECT habits.id FROM habits WHERE habits.user_id = $7::INTEGER")
+    assert first == second == "SELECT habits.id FROM habits WHERE habits.user_id = $?"
+
+
+def test_shape_keeps_sql_after_cast():
+    shape = statement_shape(
+        "SELECT habit_logs.id FROM habit_logs "
+        "WHERE habit_logs.habit_id = $1::INTEGER AND habit_logs.date >= $2::DATE ORDER BY habit_logs.date"
+    )
+    assert shape == (
+        "SELECT habit_logs.id FROM habit_logs "
+        "WHERE habit_logs.habit_id = $? AND habit_logs.date >= $? ORDER BY habit_logs.date"
+    )
+
+
+def test_shape_strips_multiword_and_array_casts():
+    shape = statement_shape(
+        "UPDATE users SET updated_at=$1::TIMESTAMP WITHOUT TIME ZONE WHERE users.id = ANY ($2::INTEGER[])"
+    )
+    assert shape == "UPDATE users SET updated_at=$? WHERE users.id = ANY ($?, ...)"
+
+
+def test_shape_collapses_in_lists():
+    short = statement_shape("SELECT * FROM habits WHERE habits.id IN ($1::INTEGER, $2::INTEGER)")
+    long = statement_shape("SELECT * FROM habits WHERE habits.id IN ($1::INTEGER, $2::INTEGER, $3::INTEGER)")
+    assert short == long == "SELECT * FROM habits WHERE habits.id IN ($?, ...)"
+
+
+def test_shape_differs_for_different_columns():
+    assert statement_shape("SELECT * FROM habits WHERE habits.id = $1::INTEGER") != \
+        statement_shape("SELECT * FROM habits WHERE habits.user_id = $1::INTEGER")
+
+
+def test_problems_within_budget():
+    log = QueryLog()
+    log.statements = ["SELECT 1", "SELECT 2"]
+    assert log.problems(budget=5, repeat_limit=3) == []
+
+
+def test_problems_over_budget():
+    log = QueryLog()
+    log.statements = [f"SELECT {i}" for i in range(6)]
+    assert log.problems(budget=5, repeat_limit=3) == ["6 запросов при бюджете 5"]
+
+
+def test_problems_detects_repeated_statement():
+    log = QueryLog()
+    log.statements = [f"SELECT * FROM habit_logs WHERE habit_logs.habit_id = ${i}::INTEGER" for i in range(1, 5)]
+    log.statements.append("SELECT * FROM habits WHERE habits.user_id = $1::INTEGER")
+    assert log.problems(budget=0, repeat_limit=3) == [
+        "N+1: 4 раз SELECT * FROM habit_logs WHERE habit_logs.habit_id = $?"
+    ]
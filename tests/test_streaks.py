@@ -0,0 +1,183 @@
+import asyncio
+import importlib.util
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+from bot.database.models import Habit
+from bot.services.streaks import compute_streak_state, record_completion, revoke_completion
+
+DAY = timedelta(days=1)
+TODAY = date(2026, 10, 17)
+
+requires_database = pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="нужна база TEST_DATABASE_URL")
+
+
+class NoQuerySession:
+    """Сессия, на которой инкрементальный путь не должен выполнять запросов"""
+
+    async def execute(self, *args, **kwargs):
+        raise AssertionError("ожидался расчёт без пересчёта по истории")
+
+
+def days_ago(*offsets):
+    return [TODAY - offset * DAY for offset in offsets]
+
+
+# compute_streak_state
+def test_state_without_logs():
+    assert compute_streak_state([]) == (0, 0, None)
+
+
+def test_state_ignores_order_and_duplicates():
+    assert compute_streak_state(days_ago(0, 2, 1, 1)) == (3, 3, TODAY)
+
+
+def test_state_current_streak_after_gap():
+    # лучшая серия — 3 дня неделю назад, текущая — 2 последних дня
+    assert compute_streak_state(days_ago(0, 1, 5, 6, 7)) == (2, 3, TODAY)
+
+
+# record_completion без пересчёта
+def test_log_first_day():
+    habit = Habit(current_streak=0, longest_streak=0, last_completed_date=None)
+    asyncio.run(record_completion(NoQuerySession(), habit, TODAY))
+    assert (habit.current_streak, habit.longest_streak, habit.last_completed_date) == (1, 1, TODAY)
+
+
+def test_log_next_day_extends_streak_and_record():
+    habit = Habit(current_streak=3, longest_streak=3, last_completed_date=TODAY - DAY)
+    asyncio.run(record_completion(NoQuerySession(), habit, TODAY))
+    assert (habit.current_streak, habit.longest_streak, habit.last_completed_date) == (4, 4, TODAY)
+
+
+def test_log_after_gap_starts_new_streak():
+    habit = Habit(current_streak=3, longest_streak=5, last_completed_date=TODAY - 2 * DAY)
+    asyncio.run(record_completion(NoQuerySession(), habit, TODAY))
+    assert (habit.current_streak, habit.longest_streak, habit.last_completed_date) == (1, 5, TODAY)
+
+
+# revoke_completion без пересчёта
+def test_unlog_last_day_of_non_record_streak():
+    habit = Habit(current_streak=3, longest_streak=5, last_completed_date=TODAY)
+    asyncio.run(revoke_completion(NoQuerySession(), habit, TODAY))
+    assert (habit.current_streak, habit.longest_streak, habit.last_completed_date) == (2, 5, TODAY - DAY)
+
+
+@pytest.mark.parametrize("current, longest, log_date", [
+    (1, 5, TODAY),           # серия обнуляется — последняя дата в предыдущей серии
+    (5, 5, TODAY),           # серия рекордная — рекорд мог принадлежать только ей
+    (3, 5, TODAY - 2 * DAY),  # отмена не последней даты
+])
+def test_unlog_needs_rebuild(current, longest, log_date):
+    habit = Habit(id=1, current_streak=current, longest_streak=longest, last_completed_date=TODAY)
+    with pytest.raises(AssertionError, match="пересчёта"):
+        asyncio.run(revoke_completion(NoQuerySession(), habit, log_date))
+
+
+def test_backdated_log_needs_rebuild():
+    habit = Habit(id=1, current_streak=2, longest_streak=2, last_completed_date=TODAY)
+    with pytest.raises(AssertionError, match="пересчёта"):
+        asyncio.run(record_completion(NoQuerySession(), habit, TODAY - 3 * DAY))
+
+
+# С базой: пересчёт по истории и заполнение в миграции 0002 совпадают с compute_streak_state
+@pytest.fixture(scope="module")
+def db(loop):
+    from bot.database.engine import async_session_maker
+
+    def run(coro_fn):
+        async def wrapper():
+            async with async_session_maker() as session:
+                return await coro_fn(session)
+        return loop.run_until_complete(wrapper())
+
+    return run
+
+
+async def create_habit(session, dates) -> Habit:
+    from bot.services.habit_logs import insert_habit_log
+
+    habit = Habit(user_id=1, name="Тест серий", habit_type="boolean")
+    session.add(habit)
+    await session.flush()
+    for log_date in sorted(dates):
+        await insert_habit_log(session, habit, log_date)
+        await record_completion(session, habit, log_date)
+    return habit
+
+
+def state(habit: Habit):
+    return habit.current_streak, habit.longest_streak, habit.last_completed_date
+
+
+@requires_database
+@pytest.mark.parametrize("history, logged", [
+    (days_ago(1, 2, 4, 5), TODAY - 3 * DAY),  # отметка задним числом склеивает две серии
+    (days_ago(0, 1), TODAY - 5 * DAY),         # отметка задним числом раньше всей истории
+])
+def test_backdated_log(db, history, logged):
+    from bot.services.habit_logs import insert_habit_log
+
+    async def scenario(session):
+        habit = await create_habit(session, history)
+        await insert_habit_log(session, habit, logged)
+        await record_completion(session, habit, logged)
+        await session.rollback()
+        return state(habit)
+
+    assert db(scenario) == compute_streak_state(history + [logged])
+
+
+@requires_database
+@pytest.mark.parametrize("history, revoked", [
+    (days_ago(0, 1, 2, 5, 6, 7, 8), TODAY),          # серия не рекордная — без пересчёта
+    (days_ago(0, 1, 2, 3, 4, 7, 8), TODAY),          # рекордная серия уменьшается вместе с рекордом
+    (days_ago(0, 3, 4, 5), TODAY),                   # единственный день серии — последней становится прошлая
+    (days_ago(0, 1, 2, 3, 4), TODAY - 2 * DAY),      # отмена в середине делит серию
+    (days_ago(0), TODAY),                            # последняя отметка
+])
+def test_unlog(db, history, revoked):
+    from bot.services.habit_logs import delete_habit_log
+
+    async def scenario(session):
+        habit = await create_habit(session, history)
+        await delete_habit_log(session, habit, revoked)
+        await revoke_completion(session, habit, revoked)
+        await session.rollback()
+        return state(habit)
+
+    assert db(scenario) == compute_streak_state([d for d in history if d != revoked])
+
+
+def load_migration(name: str):
+    path = next((Path(__file__).parent.parent / "migrations" / "versions").glob(f"{name}_*.py"))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@requires_database
+def test_backfill_matches_compute_streak_state(db):
+    from sqlalchemy import text
+
+    histories = [days_ago(0, 1, 2), days_ago(1, 2, 5, 6, 7, 8), days_ago(3), days_ago(0, 0, 2)]
+    backfill = load_migration("0002").BACKFILL_STREAKS
+
+    async def scenario(session):
+        habits = [await create_habit(session, history) for history in histories]
+        ids = [habit.id for habit in habits]
+        await session.execute(text(
+            "UPDATE habits SET current_streak = 0, longest_streak = 0, last_completed_date = NULL WHERE id = ANY(:ids)"
+        ), {"ids": ids})
+        await session.execute(text(backfill))
+        rows = (await session.execute(text(
+            "SELECT current_streak, longest_streak, last_completed_date FROM habits WHERE id = ANY(:ids) ORDER BY id"
+        ), {"ids": ids})).all()
+        await session.rollback()
+        return [tuple(row) for row in rows]
+
+    assert db(scenario) == [compute_streak_state(history) for history in histories]